@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+import bench.stages as stages
+
+# 各入口模块，按冷启动(新进程)导入耗时测量
+DEFAULT_TARGETS = (
+    'module.pcm',
+    'module.psk16',
+    'module.channel',
+    'module.audio_func',
+    'module.backend',
+    'module.pipeline',
+    'module.sweep',
+    'module.runner',
+)
+
+_SNIPPET = 'import time; start = time.perf_counter(); import %s; print(time.perf_counter() - start)'
+
+
+def _root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(target, repeat=5):
+    """
+    Time `import target` in `repeat` fresh interpreters started from the
+    repository root
+
+    Returns
+    -----------
+    record: dict
+        best and median import time in seconds, or the error message if
+        the import fails (e.g. an optional dependency is missing)
+    """
+    times = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-c', _SNIPPET % target], cwd=_root(),
+                                 capture_output=True, text=True)
+        if process.returncode:
+            return {'target': target, 'error': process.stderr.strip().splitlines()[-1]}
+        times.append(float(process.stdout))
+    return {'target': target, 'best_s': min(times), 'median_s': float(np.median(times))}
+
+
+def breakdown(target, top=10):
+    """
+    Heaviest imports of `target` according to `python -X importtime`,
+    as (cumulative seconds, module name) pairs
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % target],
+                             cwd=_root(), capture_output=True, text=True)
+    entries = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        entries.append((int(cumulative)/1e6, name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def compare(results, baseline, tolerance=stages.DEFAULT_TOLERANCE):
+    """
+    Flag the targets whose import got more than `tolerance` slower than in
+    `baseline`, or that stopped importing
+    """
+    reference = {record['target']: record for record in baseline}
+    regressions = []
+    for record in results:
+        old = reference.get(record['target'])
+        if old is None or 'error' in old:
+            continue
+        if 'error' in record:
+            regressions.append({'target': record['target'], 'error': record['error']})
+        elif record['best_s'] > old['best_s']*(1 + tolerance):
+            regressions.append({'target': record['target'], 'baseline': old['best_s'],
+                                'current': record['best_s'], 'ratio': record['best_s']/old['best_s']})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the cold import time of the entry modules')
+    parser.add_argument('--target', action='append', help='module to import, repeatable')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--breakdown', action='store_true',
+                        help='print the heaviest imports of every target')
+    parser.add_argument('--output', default='import_time.json')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=stages.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = []
+    for target in args.target or DEFAULT_TARGETS:
+        record = import_time(target, args.repeat)
+        results.append(record)
+        if 'error' in record:
+            print('%-20s failed: %s' % (target, record['error']))
+        else:
+            print('%-20s %8.1f ms' % (target, record['best_s']*1e3))
+        if args.breakdown:
+            for cumulative, name in breakdown(target):
+                print('    %8.1f ms  %s' % (cumulative*1e3, name))
+
+    report = {'environment': stages._environment(), 'results': results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = compare(results, json.load(f)['results'], args.tolerance)
+        for regression in report['regressions']:
+            print('REGRESSION %s' % regression)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
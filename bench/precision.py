@@ -0,0 +1,174 @@
+import argparse
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+import bench.stages as stages
+import module.channel as channel
+import module.psk16 as psk16
+from module.bitstream import Bitstream
+
+# 工作范围内的Eb/N0(dB)，未编码误符号率约0.6到1e-3
+DEFAULT_EBN0 = (0, 2, 4, 6, 8, 10, 12, 14, 16, 18, 20)
+DEFAULT_SYMBOLS = 1 << 17
+# 允许的float32与float64判决不一致的码元比例
+DEFAULT_MISMATCH = 1e-4
+# 同一接收信号上float32误符号率允许超出float64的相对比例
+DEFAULT_TOLERANCE = 0.01
+# 两种精度各自加噪时误符号率之差允许的标准差倍数
+DEFAULT_SIGMA = 4.0
+
+METHODS = ('correlated', 'coherent', 'baseband')
+
+
+def _decisions(signal, method, N, ratio):
+    """
+    Symbol decisions of a received block, in the precision of the block
+    """
+    if method == 'baseband':
+        return psk16.psk16_baseband_demodulate(signal, packed=True)
+    if method == 'coherent':
+        return psk16.psk16_coherent_demodulate_filtered(signal, ratio, 1, N, packed=True)
+    return psk16.psk16_correlated_demodulate_fast(signal, ratio, 1, N, packed=True)
+
+
+def _modulate(bits, method, N, ratio, dtype):
+    if method == 'baseband':
+        return psk16.psk16_baseband_modulate(bits, ratio, 1, N, dtype=dtype)
+    return psk16.psk16_modulate_fast(bits, ratio, 1, N, dtype=dtype)
+
+
+def _symbol_errors(sent, received):
+    return int(np.count_nonzero(psk16._symbols(sent) != psk16._symbols(received)))
+
+
+def check_point(ebn0_db, method='correlated', N=10, ratio=10, symbols=DEFAULT_SYMBOLS, seed=0):
+    """
+    Compare the float32 and float64 modes of the link at one Eb/N0
+
+    The same received float64 signal is demodulated once in float64 and
+    once rounded to float32, so the decisions and their symbol error rates
+    can only differ through the precision of the demodulator. The whole
+    link (modulation, noise and demodulation) is then also run natively in
+    each precision with its own noise, whose symbol error rates must agree
+    statistically.
+
+    Returns
+    -----------
+    record: dict
+        number of symbols, of differing decisions, the symbol error rates of
+        both precisions on the same received signal and on their own noise,
+        whether the float32 waveform is the rounded float64 one, and the
+        size and time of each mode
+    """
+    rng = np.random.default_rng(seed)
+    bits = Bitstream.from_bits(rng.integers(0, 2, 4*symbols, dtype=np.uint8))
+    amp = channel.ebn0_to_amp(ebn0_db, N, ratio)
+
+    signal64 = _modulate(bits, method, N, ratio, np.float64)
+    signal32 = _modulate(bits, method, N, ratio, np.float32)
+    exact = bool(np.array_equal(signal32, signal64.astype(signal32.dtype)))
+
+    # 同一接收信号分别以两种精度判决
+    received = channel.AWGNChannel(amp, N, ratio, seed=seed)(signal64.copy())
+    decided64 = _decisions(received, method, N, ratio)
+    decided32 = _decisions(received.astype(signal32.dtype), method, N, ratio)
+    mismatches = _symbol_errors(decided64, decided32)
+
+    record = {'ebn0_db': float(ebn0_db), 'method': method, 'N': N, 'ratio': ratio,
+              'symbols': symbols, 'mismatches': mismatches,
+              'mismatch_rate': mismatches/symbols, 'waveform_exact': exact,
+              'ser_same_float64': _symbol_errors(bits, decided64)/symbols,
+              'ser_same_float32': _symbol_errors(bits, decided32)/symbols}
+    # 两种精度各自生成噪声，端到端运行
+    for name, signal in (('float64', signal64), ('float32', signal32)):
+        model = channel.AWGNChannel(amp, N, ratio, seed=seed+1)
+        start = time.perf_counter()
+        decided = _decisions(model(signal), method, N, ratio)
+        record['time_%s_s' % name] = time.perf_counter() - start
+        record['ser_%s' % name] = _symbol_errors(bits, decided)/symbols
+        record['nbytes_%s' % name] = signal.nbytes
+    return record
+
+
+def failures(record, max_mismatch=DEFAULT_MISMATCH, tolerance=DEFAULT_TOLERANCE, sigma=DEFAULT_SIGMA):
+    """
+    Reasons for which the float32 mode fails at the point of `record`, an
+    empty list if it passes
+
+    On the same received signal, the float32 symbol error rate may exceed
+    the float64 one by `tolerance` relative (plus one symbol), and at most
+    `max_mismatch` of the decisions may differ. With their own noise, both
+    error rates must agree within `sigma` standard deviations.
+    """
+    reasons = []
+    if not record['waveform_exact']:
+        reasons.append('float32 waveform is not the rounded float64 one')
+    if record['mismatch_rate'] > max_mismatch:
+        reasons.append('%d differing decisions' % record['mismatches'])
+    allowed = record['ser_same_float64']*(1 + tolerance) + 1/record['symbols']
+    if record['ser_same_float32'] > allowed:
+        reasons.append('SER on the same signal %.3e > %.3e' % (record['ser_same_float32'], allowed))
+    if not consistent(record, sigma):
+        reasons.append('SER with own noise %.3e / %.3e' % (record['ser_float64'], record['ser_float32']))
+    return reasons
+
+
+def consistent(record, sigma=DEFAULT_SIGMA):
+    """
+    Whether the symbol error rates of both precisions agree within `sigma`
+    standard deviations of their difference
+    """
+    p = (record['ser_float64'] + record['ser_float32'])/2
+    deviation = math.sqrt(2*p*(1-p)/record['symbols'])
+    return abs(record['ser_float64'] - record['ser_float32']) <= sigma*deviation + 1/record['symbols']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Check that the float32 mode decides like float64 over the operating Eb/N0 range')
+    parser.add_argument('--ebn0', action='append', type=float, help='Eb/N0 in dB, repeatable')
+    parser.add_argument('--method', action='append', choices=METHODS, help='demodulation, repeatable')
+    parser.add_argument('--setting', nargs=2, type=int, default=(10, 10), metavar=('N', 'RATIO'))
+    parser.add_argument('--symbols', type=int, default=DEFAULT_SYMBOLS)
+    parser.add_argument('--max-mismatch', type=float, default=DEFAULT_MISMATCH,
+                        help='allowed fraction of differing decisions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed relative excess of the float32 symbol error rate '
+                             'on the same received signal')
+    parser.add_argument('--sigma', type=float, default=DEFAULT_SIGMA)
+    parser.add_argument('--output', default='precision.json')
+    args = parser.parse_args(argv)
+
+    N, ratio = args.setting
+    results = []
+    failed = []
+    for method in args.method or METHODS:
+        for ebn0_db in args.ebn0 or DEFAULT_EBN0:
+            record = check_point(ebn0_db, method, N, ratio, args.symbols)
+            record['consistent'] = consistent(record, args.sigma)
+            record['failures'] = failures(record, args.max_mismatch, args.tolerance, args.sigma)
+            results.append(record)
+            print('%-10s %5.1f dB  mismatches %6d  SER %.3e / %.3e  %5.1f / %5.1f ms' % (
+                method, ebn0_db, record['mismatches'], record['ser_float64'], record['ser_float32'],
+                record['time_float64_s']*1e3, record['time_float32_s']*1e3))
+            if record['failures']:
+                failed.append(record)
+
+    for record in failed:
+        print('FAILED %s at %.1f dB: %s' % (record['method'], record['ebn0_db'],
+                                           '; '.join(record['failures'])))
+    print('%d of %d points failed' % (len(failed), len(results)))
+
+    with open(args.output, 'w') as f:
+        json.dump({'environment': stages._environment(), 'results': results,
+                   'failures': len(failed)}, f, indent=2)
+    # 任一工作点超出容差时返回非零退出码，可作为回归检查
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
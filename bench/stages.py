@@ -0,0 +1,334 @@
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import module.backend as backend
+import module.channel as channel
+import module.psk16 as psk16
+
+# 默认的输入规模(PCM样点数)与载波参数(N, fc/fs)
+DEFAULT_SIZES = (1024, 16384)
+DEFAULT_SETTINGS = ((10, 10), (16, 4))
+# 中位吞吐量低于基线的该比例(另加基线各轮的离散度)时视为性能退化
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_REPEAT = 7
+
+_cases = {}
+
+
+def case(name, unit, carrier=True):
+    """
+    Decorator registering a benchmark case
+
+    The decorated function takes (size, N, ratio, rng, dtype) and returns
+    the callable to time and the number of `unit` (samples or bits) it
+    processes per call, `dtype` being the floating point precision of the
+    signals. Cases with `carrier` False do not depend on N and ratio and
+    run once per size.
+    """
+    def decorator(func):
+        _cases[name] = (func, unit, carrier)
+        return func
+    return decorator
+
+
+def _audio(size, rng):
+    return rng.integers(-20000, 20000, size).astype(np.int16)
+
+
+def _pcm(size, rng):
+    return backend.kernel('pcm_encode')(_audio(size, rng), 0)
+
+
+def _coded(size, rng):
+    return backend.kernel('correction_en')(_pcm(size, rng)[0])
+
+
+def _signal(size, N, ratio, rng, dtype=np.float64):
+    signal = backend.kernel('psk16_modulate')(_coded(size, rng), ratio, 1, N, dtype)
+    return signal + 0.1*rng.standard_normal(len(signal), dtype=dtype)
+
+
+@case('pcm_encode', 'samples', carrier=False)
+def _pcm_encode(size, N, ratio, rng, dtype):
+    data = _audio(size, rng)
+    func = backend.kernel('pcm_encode')
+    return (lambda: func(data, 0)), size
+
+
+@case('pcm_decode', 'samples', carrier=False)
+def _pcm_decode(size, N, ratio, rng, dtype):
+    stream, data_max = _pcm(size, rng)
+    func = backend.kernel('pcm_decode')
+    return (lambda: func(stream, data_max, dtype)), size
+
+
+@case('correction_en', 'bits', carrier=False)
+def _correction_en(size, N, ratio, rng, dtype):
+    stream = _pcm(size, rng)[0]
+    func = backend.kernel('correction_en')
+    return (lambda: func(stream)), stream.length
+
+
+@case('correction_de', 'bits', carrier=False)
+def _correction_de(size, N, ratio, rng, dtype):
+    stream = _coded(size, rng)
+    func = backend.kernel('correction_de')
+    return (lambda: func(stream)), stream.length
+
+
+@case('psk16_modulate', 'bits')
+def _psk16_modulate(size, N, ratio, rng, dtype):
+    stream = _coded(size, rng)
+    func = backend.kernel('psk16_modulate')
+    return (lambda: func(stream, ratio, 1, N, dtype)), stream.length
+
+
+@case('psk16_correlated_demodulate', 'bits')
+def _psk16_correlated_demodulate(size, N, ratio, rng, dtype):
+    signal = _signal(size, N, ratio, rng, dtype)
+    func = backend.kernel('psk16_correlated_demodulate')
+    return (lambda: func(signal, ratio, 1, N)), 4*len(signal)//(N*ratio)
+
+
+@case('psk16_coherent_demodulate', 'bits')
+def _psk16_coherent_demodulate(size, N, ratio, rng, dtype):
+    signal = _signal(size, N, ratio, rng, dtype)
+    if backend.get_backend() == 'loop':
+        func = psk16.psk16_coherent_demodulate
+    else:
+        func = psk16.psk16_coherent_demodulate_filtered
+    return (lambda: func(signal, ratio, 1, N, packed=True)), 4*len(signal)//(N*ratio)
+
+
+@case('awgn', 'samples')
+def _awgn(size, N, ratio, rng, dtype):
+    signal = _signal(size, N, ratio, rng, dtype)
+    if backend.get_backend() == 'loop':
+        return (lambda: channel.AWGN(signal, 0.3)), len(signal)
+    model = channel.AWGNChannel(0.3, N, ratio, seed=0)
+    # 原地加噪，不计复制的开销；噪声逐次累加，不影响计时
+    return (lambda: model(signal, inplace=True)), len(signal)
+
+
+def _peak_rss():
+    """
+    Peak resident set size of the process in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak*1024
+
+
+def measure(func, repeat=DEFAULT_REPEAT, min_time=0.05):
+    """
+    Time `func`: the call is repeated until a round lasts `min_time`, the
+    best and median time per call over `repeat` rounds are returned with
+    their spread (interquartile range relative to the median) and the peak traced
+    allocation of one extra call
+    """
+    func()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    times = [elapsed/number]
+    for _ in range(repeat-1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start)/number)
+
+    # 单独运行一次统计内存分配峰值，tracemalloc的开销不计入计时
+    tracemalloc.start()
+    func()
+    peak_alloc = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    median = float(np.median(times))
+    # 四分位距比极差更不易受单轮干扰的影响
+    spread = float(np.subtract(*np.percentile(times, [75, 25])))/median
+    return min(times), median, spread, peak_alloc
+
+
+def _measure_case(name, size, N, ratio, kernel_backend, repeat, seed, dtype):
+    """
+    Measure one case at one size and setting and return its record
+    """
+    backend.set_backend(kernel_backend)
+    func, unit, carrier = _cases[name]
+    rng = np.random.default_rng(seed)
+    call, items = func(size, N, ratio, rng, np.dtype(dtype))
+    best, median, spread, peak_alloc = measure(call, repeat)
+    return {'case': name, 'backend': kernel_backend, 'dtype': dtype, 'size': size,
+            'N': N if carrier else None, 'ratio': ratio if carrier else None,
+            'unit': unit, 'items': items, 'best_s': best, 'median_s': median,
+            'spread': spread, 'throughput': items/best, 'median_throughput': items/median,
+            'peak_alloc_bytes': peak_alloc,
+            'peak_rss_bytes': _peak_rss()}
+
+
+def run(cases=None, sizes=DEFAULT_SIZES, settings=DEFAULT_SETTINGS,
+        kernel_backend='vectorized', repeat=DEFAULT_REPEAT, seed=0, dtype='float64', isolate=True):
+    """
+    Run the benchmark cases over the input sizes and carrier settings
+
+    Parameters
+    -----------
+    cases: list of str, optional
+        names of the cases to run, all if not given
+
+    sizes: sequence of int
+        input sizes in PCM samples
+
+    settings: sequence of (int, int)
+        (N, ratio) carrier settings
+
+    kernel_backend: str
+        backend of `backend.py` to benchmark
+
+    repeat: int
+        number of timed rounds
+
+    seed: int
+        seed of the input data
+
+    dtype: str
+        floating point precision of the signals, see `psk16.DTYPES`
+
+    isolate: bool
+        run each case in a fresh process, so that the peak RSS is the one
+        of the case alone; in the current process the peak RSS only grows
+        and includes all the cases run before
+
+    Returns
+    -----------
+    results: list of dict
+        one record per case, size and setting with the best and median
+        time per call and their spread, the best and median throughput
+        in units/s, the peak traced
+        allocation and the peak RSS of the process
+    """
+    results = []
+    for name in cases or sorted(_cases):
+        carrier = _cases[name][2]
+        for size in sizes:
+            for N, ratio in (settings if carrier else settings[:1]):
+                task = (name, size, N, ratio, kernel_backend, repeat, seed, dtype)
+                if isolate:
+                    # spawn而非fork，子进程不继承父进程已占用的内存
+                    context = multiprocessing.get_context('spawn')
+                    with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+                        record = executor.submit(_measure_case, *task).result()
+                else:
+                    record = _measure_case(*task)
+                results.append(record)
+    return results
+
+
+def _key(record):
+    # 早期的结果没有dtype字段，均为float64
+    return '%s[%s,%s,size=%d,N=%s,ratio=%s]' % (record['case'], record['backend'],
+                                                record.get('dtype', 'float64'), record['size'],
+                                                record['N'], record['ratio'])
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Flag the results whose median throughput fell below the one of the same
+    case in `baseline` by more than `tolerance` plus the spread of the
+    baseline rounds
+
+    The best time of a single run varies by tens of percent on a loaded
+    machine, the median over the rounds and the measured spread keep the
+    check usable as a gate.
+
+    Returns
+    -----------
+    regressions: list of dict
+        case key, baseline and current median throughput, their ratio and
+        the allowed drop
+    """
+    reference = {_key(record): record for record in baseline}
+    regressions = []
+    for record in results:
+        old = reference.get(_key(record))
+        if old is None:
+            continue
+        # 早期的基线没有中位吞吐量与离散度
+        before = old['items']/old['median_s']
+        current = record['items']/record['median_s']
+        allowed = tolerance + old.get('spread', 0.0)
+        ratio = current/before
+        if ratio < 1 - allowed:
+            regressions.append({'case': _key(record), 'baseline': before, 'current': current,
+                                'ratio': ratio, 'allowed': allowed})
+    return regressions
+
+
+def _environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the stages of the 16PSK link')
+    parser.add_argument('--case', action='append', choices=sorted(_cases),
+                        help='case to run, repeatable (default: all)')
+    parser.add_argument('--size', action='append', type=int,
+                        help='input size in PCM samples, repeatable')
+    parser.add_argument('--setting', action='append', nargs=2, type=int, metavar=('N', 'RATIO'),
+                        help='carrier setting, repeatable')
+    parser.add_argument('--backend', default='vectorized', choices=backend.BACKENDS)
+    parser.add_argument('--dtype', default='float64', choices=psk16.DTYPES,
+                        help='floating point precision of the signals')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='number of timed rounds, the median is compared to the baseline')
+    parser.add_argument('--no-isolate', dest='isolate', action='store_false',
+                        help='run all cases in this process, the peak RSS is then cumulative')
+    parser.add_argument('--output', default='bench_results.json',
+                        help='JSON file receiving the results')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed relative drop of the median throughput beyond the baseline spread')
+    args = parser.parse_args(argv)
+
+    results = run(args.case, args.size or DEFAULT_SIZES,
+                  [tuple(s) for s in args.setting] if args.setting else DEFAULT_SETTINGS,
+                  args.backend, args.repeat, dtype=args.dtype, isolate=args.isolate)
+    for record in results:
+        print('%-60s %12.4g %s/s  IQR %3.0f%%  %8.1f KiB' % (
+            _key(record), record['median_throughput'], record['unit'], record['spread']*100,
+            record['peak_alloc_bytes']/1024))
+
+    report = {'environment': _environment(), 'results': results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        report['regressions'] = compare(results, baseline, args.tolerance)
+        for regression in report['regressions']:
+            print('REGRESSION %s: %.4g -> %.4g (x%.2f, allowed x%.2f)' % (
+                regression['case'], regression['baseline'], regression['current'],
+                regression['ratio'], 1 - regression['allowed']))
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
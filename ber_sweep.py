@@ -0,0 +1,46 @@
+import json
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import module.sweep as sweep
+
+if __name__ == "__main__":
+    time_start = time.time()
+
+    # Eb/N0扫描范围(dB)
+    ebn0_grid = np.arange(0, 17, 1)
+    # 复基带等效仿真，每码元一个复样点，误码统计与通带仿真一致；改为'passband'则合成调制波形
+    mode = 'baseband'
+    # 格雷码星座映射，相邻星座点只差一位，与理论曲线的假设一致
+    mapping = 'gray'
+
+    # 无差错控制编码与有差错控制编码两种情况，每点收集1000个错误比特后停止
+    results_uncoded = sweep.sweep(ebn0_grid, seed=0, target_errors=1000, max_bits=10**7, mode=mode, mapping=mapping)
+    results_coded = sweep.sweep(ebn0_grid, seed=1, coded=True, target_errors=1000, max_bits=10**7, mode=mode, mapping=mapping)
+    # 解调输出比特对数似然比，软判决最大似然译码
+    results_soft = sweep.sweep(ebn0_grid, seed=2, coded=True, soft=True, target_errors=1000, max_bits=10**7, mode=mode, mapping=mapping)
+
+    time_end = time.time()
+
+    with open('ber_sweep.json', 'w') as f:
+        json.dump({'uncoded': results_uncoded, 'coded': results_coded, 'coded_soft': results_soft,
+                   'time_cost': time_end-time_start}, f, indent=2)
+
+    # 绘制误码率-比特能量图像，并与16PSK理论曲线比较
+    ebn0_fine = np.linspace(ebn0_grid[0], ebn0_grid[-1], 200)
+    plt.figure('BER vs Eb/N0')
+    plt.semilogy(ebn0_fine, sweep.psk16_ber_theory(ebn0_fine), 'k--', label='16PSK theory (Gray)')
+    plt.semilogy([r['ebn0_db'] for r in results_uncoded], [r['ber'] for r in results_uncoded],
+                 'o-', label='uncoded')
+    plt.semilogy([r['ebn0_db'] for r in results_coded], [r['ber'] for r in results_coded],
+                 's-', label='(12,8) coded')
+    plt.semilogy([r['ebn0_db'] for r in results_soft], [r['ber'] for r in results_soft],
+                 'd-', label='(12,8) coded, soft ML')
+    plt.xlabel('Eb/N0 (dB)')
+    plt.ylabel('BER')
+    plt.grid(True, which='both')
+    plt.legend()
+    plt.savefig('figure/ber_sweep.png')
+    plt.show()
@@ -1,8 +1,4 @@
-import numpy as np
-import scipy
-import scipy.io.wavfile
-import wave
-import matplotlib.pyplot as plt
+import argparse
 import time
 
 import module.pcm as pcm
@@ -10,33 +6,45 @@ import module.psk16 as psk16
 import module.channel as channel
 import module.audio_func as audio_func
 import module.correction as correction
+import module.metrics as metrics
+import module.profiling as profiling
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Transmit audio.wav through the 16PSK link')
+    parser.add_argument('--profile', action='store_true',
+                        help='record the time, data size and allocation peak of every stage '
+                             'in profile.json and profile_trace.json (slows the run down)')
+    args = parser.parse_args()
+
     time_start=time.time()
+    # 默认不剖析；开启时记录各级处理的耗时、数据量与内存分配峰值
+    if args.profile:
+        profiling.enable(memory=True)
+    stage = profiling.profiled
 
-    fs,data_raw = scipy.io.wavfile.read('audio.wav')
-    # PCM编码
-    data_encoded_pcm,m = pcm.PCM_encode(data_raw)
+    fs,data_raw = audio_func.audioread('audio.wav',mmap=True)
+    # PCM编码，各级之间以压缩比特流传递
+    data_encoded_pcm,m = stage('PCM_encode')(pcm.PCM_encode)(data_raw,packed=True)
     # 差错控制编码
-    data_encoded_pcm_corr = correction.correction_en(data_encoded_pcm)
+    data_encoded_pcm_corr = stage('correction_en')(correction.correction_en_table)(data_encoded_pcm)
     # 16PSK调制，每载波周期10个点，每码元周期10个载波周期
-    data_encoded_analog = psk16.psk16_modulate(data_encoded_pcm_corr,10*fs,fs,10)
-    # 加噪声，噪声增益0.3
-    data_encoded_analog_n = channel.AWGN(data_encoded_analog,0.3)
+    data_encoded_analog = stage('psk16_modulate')(psk16.psk16_modulate_fast)(data_encoded_pcm_corr,10*fs,fs,10)
+    # 加噪声，噪声增益0.3，固定种子使结果可复现
+    data_encoded_analog_n = stage('AWGN')(channel.AWGNChannel(0.3,10,10,seed=0))(data_encoded_analog)
     
     
     # 对接收的信号进行相关解调
-    data_decoded_pcm_correlated = psk16.psk16_correlated_demodulate(data_encoded_analog_n,10*fs,fs,10)
+    data_decoded_pcm_correlated = stage('psk16_correlated_demodulate')(psk16.psk16_correlated_demodulate_fast)(data_encoded_analog_n,10*fs,fs,10,packed=True)
     # 差错控制译码
-    data_encoded_pcm_correlated_corr = correction.correction_de(data_decoded_pcm_correlated)
+    data_encoded_pcm_correlated_corr = stage('correction_de')(correction.correction_de_table)(data_decoded_pcm_correlated)
     # PCM译码
-    data_decoded_raw_correlated = pcm.PCM_decode(data_encoded_pcm_correlated_corr, m)
+    data_decoded_raw_correlated = stage('PCM_decode')(pcm.PCM_decode)(data_encoded_pcm_correlated_corr, m)
     
     
     # 对接收的信号进行相干解调
-    # data_decoded_pcm_coherent = psk16.psk16_coherent_demodulate(data_encoded_analog_n,10*fs,fs,10)
+    # data_decoded_pcm_coherent = stage('psk16_coherent_demodulate')(psk16.psk16_coherent_demodulate_filtered)(data_encoded_analog_n,10*fs,fs,10,packed=True)
     # 差错控制译码
-    # data_encoded_pcm_coherent_corr = correction.correction_de(data_decoded_pcm_coherent)
+    # data_encoded_pcm_coherent_corr = correction.correction_de_table(data_decoded_pcm_coherent)
     # PCM译码
     # data_decoded_raw_coherent = pcm.PCM_decode(data_encoded_pcm_coherent_corr, m)
     
@@ -46,39 +54,24 @@ if __name__ == "__main__":
     # audio_func.audiowrite(data_decoded_raw_coherent,fs,'audio_coherent_decoded_4_corr.wav')
 
     time_end=time.time()
+    if args.profile:
+        profiling.disable()
+        # 各级处理的统计结果，以及可在chrome://tracing中查看的时间线
+        profiling.write_json('profile.json')
+        profiling.write_chrome_trace('profile_trace.json')
 
-    with open ('coherent_corr_pcm.txt','w') as f:
-        err = 0
-        length = len(data_encoded_pcm)//8
-        for i in range(length):
-            for j in range(8):
-                if data_encoded_pcm[8*i+j] != data_encoded_pcm_correlated_corr[8*i+j]:
-                    err+=1
-                    break
-
-        errate = err/length
-        f.write(str(err))
-        f.write('\n')
-        f.write(str(errate))
-        f.write('\n')
-        f.write('time cost:')
-        f.write(str(time_end-time_start))
-
+    # 记录系统的运行时间和误码率_相关解调
+    record = metrics.link_metrics(data_encoded_pcm, data_encoded_pcm_correlated_corr,
+                                  data_encoded_pcm_corr, data_decoded_pcm_correlated,
+                                  data_raw, data_decoded_raw_correlated,
+                                  pcm.PCM_decode(data_encoded_pcm, m))
+    record['time_cost'] = time_end-time_start
+    metrics.write_record(record, 'correlated_corr_pcm.json')
 
     # 记录系统的运行时间和误码率_相干解调
-    # with open ('coherent_corr_pcm.txt','w') as f:
-    #     err = 0
-    #     length = len(data_encoded_pcm)//8
-    #     for i in range(length):
-    #         for j in range(8):
-    #             if data_encoded_pcm[8*i+j] != data_encoded_pcm_coherent_corr[8*i+j]:
-    #                 err+=1
-    #                 break
-
-    #     errate = err/length
-    #     f.write(str(err))
-    #     f.write('\n')
-    #     f.write(str(errate))
-    #     f.write('\n')
-    #     f.write('time cost:')
-    #     f.write(str(time_end-time_start))
\ No newline at end of file
+    # record = metrics.link_metrics(data_encoded_pcm, data_encoded_pcm_coherent_corr,
+    #                               data_encoded_pcm_corr, data_decoded_pcm_coherent,
+    #                               data_raw, data_decoded_raw_coherent,
+    #                               pcm.PCM_decode(data_encoded_pcm, m))
+    # record['time_cost'] = time_end-time_start
+    # metrics.write_record(record, 'coherent_corr_pcm.json')
@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+
+import module.backend as backend
+import module.psk16 as psk16
+import module.runner as runner
+
+
+def _value(text):
+    """
+    Parse a --set value as JSON, falling back to the raw string
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m module',
+        description='Run the PCM - (12,8) - 16PSK link for one or more configurations')
+    parser.add_argument('configs', nargs='*',
+                        help='JSON or YAML configuration files, the defaults if none is given')
+    parser.add_argument('--backend', choices=backend.BACKENDS, help='kernel backend for every run')
+    parser.add_argument('--dtype', choices=psk16.DTYPES, help='floating point precision of every run')
+    parser.add_argument('--chunk', type=int, help='samples per block')
+    parser.add_argument('--workers', type=int, help='worker processes')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='override a configuration key for every run, VALUE is JSON')
+    parser.add_argument('--print-config', action='store_true',
+                        help='print the complete configurations and exit')
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for option in ('backend', 'dtype', 'chunk', 'workers'):
+        if getattr(args, option) is not None:
+            overrides[option] = getattr(args, option)
+    for item in args.set:
+        key, _, value = item.partition('=')
+        overrides[key] = _value(value)
+
+    configs = []
+    for path in args.configs:
+        configs.extend(runner.load_configs(path))
+    configs = [runner.make_config(config, **overrides) for config in configs or [{}]]
+
+    if args.print_config:
+        json.dump(configs, sys.stdout, indent=2)
+        print()
+        return 0
+
+    for record in runner.run_batch(configs):
+        print('%-24s %8d samples %6d errors  %.3e  %.2fs' % (
+            record['config']['name'], record['samples'], record['errors'],
+            record['error_rate'], record['time_cost']))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
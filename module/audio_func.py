@@ -1,7 +1,6 @@
+import struct
 import wave
-import pyaudio
 import numpy as np
-import scipy
 
    
 def audioplayer(path, frames_per_buffer=1024):
@@ -13,6 +12,9 @@ def audioplayer(path, frames_per_buffer=1024):
     
     2020-2-25   Jie Y.  Init
     '''
+    # 播放时才导入pyaudio，未安装PortAudio的主机也可使用本模块的读写功能
+    import pyaudio
+
     wf = wave.open(path, 'rb')
     p = pyaudio.PyAudio()
     stream = p.open(format=p.get_format_from_width(wf.getsampwidth()),
@@ -50,6 +52,50 @@ def audiowrite(data, fs, path, binary=True, channel=1):
         wf.setframerate(fs)
         wf.setnchannels(channel)
         wf.setsampwidth(2)
-        wf.writeframes(b''.join(data))
+        wf.writeframes(data.tobytes())
+        wf.close()
     else:
-        scipy.io.wavfile.write(path, fs, data)
\ No newline at end of file
+        import scipy.io.wavfile
+        scipy.io.wavfile.write(path, fs, data)
+
+
+def audioread(path, mmap=False):
+    '''
+    读取.wav文件
+    :param path: 文件路径
+    :param mmap: 是否以内存映射方式读取，为True时返回的数据不复制到内存中
+    :return: 采样率(Hz)与语音信息数据
+    '''
+    import scipy.io.wavfile
+    return scipy.io.wavfile.read(path, mmap=mmap)
+
+
+def _wav_header(fs, length, channel=1, sampwidth=2):
+    '''
+    生成PCM格式.wav文件的44字节文件头
+    '''
+    data_size = length * channel * sampwidth
+    return struct.pack('<4sI4s4sIHHIIHH4sI',
+                       b'RIFF', 36 + data_size, b'WAVE',
+                       b'fmt ', 16, 1, channel, fs,
+                       fs * channel * sampwidth, channel * sampwidth, 8 * sampwidth,
+                       b'data', data_size)
+
+
+def audiowrite_mmap(path, fs, length, channel=1):
+    '''
+    创建16位.wav文件并以内存映射方式返回其数据段，向返回的数组写入即写入文件
+    :param path: 文件路径
+    :param fs: 采样率(Hz)
+    :param length: 每通道的样点数
+    :param channel: 通道数
+    :return: 可写的np.memmap，形状为(length,)或(length, channel)
+    '''
+    with open(path, 'wb') as f:
+        f.write(_wav_header(fs, length, channel))
+        f.truncate(44 + 2 * length * channel)
+
+    shape = (length,) if channel == 1 else (length, channel)
+    if length == 0:
+        return np.zeros(shape, dtype='<i2')
+    return np.memmap(path, dtype='<i2', mode='r+', offset=44, shape=shape)
\ No newline at end of file
@@ -0,0 +1,180 @@
+import numpy as np
+
+import module.correction as correction
+import module.kernels as kernels
+import module.pcm as pcm
+import module.psk16 as psk16
+from module.bitstream import Bitstream
+
+# 可选的实现：逐点循环(原始实现)、NumPy向量化、Numba编译
+BACKENDS = ('loop', 'vectorized', 'jit')
+
+_registry = {}
+_backend = 'vectorized'
+
+
+def register(name, backend):
+    """
+    Decorator registering `func` as the `backend` implementation of the
+    kernel `name`
+
+    All implementations of a kernel take and return the same types, bits
+    are passed as Bitstream.
+    """
+    if backend not in BACKENDS:
+        raise ValueError('unknown backend %r' % backend)
+
+    def decorator(func):
+        _registry.setdefault(name, {})[backend] = func
+        return func
+    return decorator
+
+
+def available_backends():
+    """
+    Backends usable on this host, 'jit' needs Numba
+    """
+    return [backend for backend in BACKENDS if backend != 'jit' or kernels.AVAILABLE]
+
+
+def set_backend(backend):
+    """
+    Select the backend used by `kernel` when none is given, 'jit' falls
+    back to 'vectorized' when Numba is not installed
+    """
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError('unknown backend %r' % backend)
+    _backend = backend
+
+
+def get_backend():
+    return _backend
+
+
+def kernel(name, backend=None):
+    """
+    Implementation of the kernel `name` for `backend` (the selected one if
+    not given), the vectorized implementation if the backend has none or
+    is not available
+    """
+    backend = backend or _backend
+    implementations = _registry[name]
+    if backend == 'jit' and not kernels.AVAILABLE:
+        backend = 'vectorized'
+    return implementations.get(backend, implementations['vectorized'])
+
+
+def kernel_names():
+    return sorted(_registry)
+
+
+# PCM编码：输入信号 -> (Bitstream, 最大幅值)
+@register('pcm_encode', 'loop')
+def _pcm_encode_loop(in_data, vp=0):
+    out_data, data_max = pcm.PCM_encode(in_data, vp)
+    return Bitstream.from_bits(out_data), data_max
+
+
+@register('pcm_encode', 'vectorized')
+def _pcm_encode_vectorized(in_data, vp=0):
+    return pcm.PCM_encode(in_data, vp, packed=True)
+
+
+@register('pcm_encode', 'jit')
+def _pcm_encode_jit(in_data, vp=0):
+    data_max = np.max(np.abs(in_data)) if vp == 0 else vp
+    in_data = np.ascontiguousarray(in_data/data_max*4096, dtype=np.float64)
+    out_data = np.empty(len(in_data), dtype=np.uint8)
+    kernels.pcm_encode_kernel(in_data, kernels.SEG_START, kernels.SEG_STEP, out_data)
+    return Bitstream(out_data), data_max
+
+
+# PCM译码：Bitstream -> 信号
+@register('pcm_decode', 'loop')
+def _pcm_decode_loop(in_data, v, dtype=np.float64):
+    return pcm.PCM_decode(in_data.to_bits(np.float64), v).astype(dtype, copy=False)
+
+
+@register('pcm_decode', 'vectorized')
+def _pcm_decode_vectorized(in_data, v, dtype=np.float64):
+    return pcm.PCM_decode_fast(in_data, v, dtype)
+
+
+# (12,8)编码与译码：Bitstream -> Bitstream
+@register('correction_en', 'loop')
+def _correction_en_loop(in_data):
+    return correction.correction_en(in_data)
+
+
+@register('correction_en', 'vectorized')
+def _correction_en_vectorized(in_data):
+    return correction.correction_en_table(in_data)
+
+
+@register('correction_en', 'jit')
+def _correction_en_jit(in_data):
+    length = in_data.length//8
+    words = np.empty(length, dtype=np.uint16)
+    kernels.correction_encode_kernel(in_data.data[:length], kernels.GENERATE_ROWS, words)
+    return Bitstream(correction._pack12(words), 12*length)
+
+
+@register('correction_de', 'loop')
+def _correction_de_loop(in_data):
+    return correction.correction_de(in_data)
+
+
+@register('correction_de', 'vectorized')
+def _correction_de_vectorized(in_data):
+    return correction.correction_de_table(in_data)
+
+
+@register('correction_de', 'jit')
+def _correction_de_jit(in_data):
+    length = in_data.length//12
+    words = correction._unpack12(in_data.data, length)
+    out_data = np.empty(length, dtype=np.uint8)
+    kernels.correction_decode_kernel(words, kernels.SUPERVISION_ROWS, kernels.ERROR_PATTERNS, out_data)
+    return Bitstream(out_data, 8*length)
+
+
+# 16PSK调制：Bitstream -> 模拟信号
+@register('psk16_modulate', 'loop')
+def _psk16_modulate_loop(in_data, fc, fs, N, dtype=np.float64):
+    return psk16.psk16_modulate(in_data, fc, fs, N).astype(dtype, copy=False)
+
+
+@register('psk16_modulate', 'vectorized')
+def _psk16_modulate_vectorized(in_data, fc, fs, N, dtype=np.float64):
+    return psk16.psk16_modulate_fast(in_data, fc, fs, N, dtype=dtype)
+
+
+@register('psk16_modulate', 'jit')
+def _psk16_modulate_jit(in_data, fc, fs, N, dtype=np.float64):
+    symbols = psk16._symbols(in_data)
+    ratio = int(fc/fs)
+    out_data = np.empty(len(symbols)*N*ratio, dtype=dtype)
+    kernels.psk16_modulate_kernel(symbols, kernels.PHASETAB, psk16._carrier(N), ratio, out_data)
+    return out_data
+
+
+# 16PSK相关解调：模拟信号 -> Bitstream
+@register('psk16_correlated_demodulate', 'loop')
+def _psk16_correlated_demodulate_loop(in_data, fc, fs, N):
+    return psk16.psk16_correlated_demodulate(in_data, fc, fs, N, packed=True)
+
+
+@register('psk16_correlated_demodulate', 'vectorized')
+def _psk16_correlated_demodulate_vectorized(in_data, fc, fs, N):
+    return psk16.psk16_correlated_demodulate_fast(in_data, fc, fs, N, packed=True)
+
+
+@register('psk16_correlated_demodulate', 'jit')
+def _psk16_correlated_demodulate_jit(in_data, fc, fs, N):
+    ratio = int(fc/fs)
+    code_dec = np.empty(len(in_data)//(ratio*N), dtype=np.uint8)
+    # float32信号直接相关，不转换为float64
+    in_data = np.ascontiguousarray(in_data, dtype=np.float32 if in_data.dtype == np.float32 else np.float64)
+    kernels.psk16_correlate_kernel(in_data, psk16._carrier(N), ratio, code_dec)
+    return psk16.symbol_bits(code_dec, packed=True)
@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class Bitstream:
+    """
+    Packed binary stream passed between the PCM, correction and 16PSK stages
+
+    Bits are stored 8 per byte in a uint8 ndarray (MSB first, the order of
+    `np.packbits`), `length` keeps the number of valid bits since the last
+    byte may be padded with zeros.
+
+    Attributes
+    -----------
+    data: ndarray(ceil(length/8)), uint8
+        packed bits
+
+    length: int
+        number of bits in the stream
+    """
+    __slots__ = ('data', 'length')
+
+    bitorder = 'big'
+
+    def __init__(self, data, length=None):
+        data = np.asarray(data, dtype=np.uint8).reshape(-1)
+        if length is None:
+            length = 8*len(data)
+        if not 0 <= 8*len(data)-length < 8:
+            raise ValueError('length %d does not fit in %d bytes' % (length, len(data)))
+        self.data = data
+        self.length = int(length)
+
+    @classmethod
+    def from_bits(cls, bits):
+        """
+        Pack an ndarray of 0/1 values (any dtype) into a Bitstream
+        """
+        bits = np.asarray(bits).reshape(-1)
+        return cls(np.packbits(bits != 0, bitorder=cls.bitorder), len(bits))
+
+    def to_bits(self, dtype=np.uint8):
+        """
+        Unpack to an ndarray(length) of 0/1 values of the given dtype
+        """
+        bits = np.unpackbits(self.data, count=self.length, bitorder=self.bitorder)
+        return bits.astype(dtype, copy=False)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def __len__(self):
+        return self.length
+
+    def __eq__(self, other):
+        if not isinstance(other, Bitstream):
+            return NotImplemented
+        return self.length == other.length and np.array_equal(self.data, other.data)
+
+    def __repr__(self):
+        return 'Bitstream(length=%d, nbytes=%d)' % (self.length, self.nbytes)
+
+
+def as_bits(in_data, dtype=np.float64):
+    """
+    Return the bits of a Bitstream or an ndarray as an unpacked ndarray
+
+    Parameters
+    -----------
+    in_data: Bitstream or ndarray(n)
+        input bits
+
+    dtype: numpy dtype
+        dtype of the unpacked bits, ndarray input is returned unchanged
+
+    Returns
+    -----------
+    out_data: ndarray(n)
+        unpacked bits
+    """
+    if isinstance(in_data, Bitstream):
+        return in_data.to_bits(dtype)
+    return in_data
+
+
+def like(out_data, in_data):
+    """
+    Pack `out_data` if `in_data` is a Bitstream, so a stage returns bits in
+    the same representation it received them
+    """
+    if isinstance(in_data, Bitstream):
+        return Bitstream.from_bits(out_data)
+    return out_data
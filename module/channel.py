@@ -1,6 +1,14 @@
+import math
+
 import numpy as np
 
-def AWGN(in_data,amp):
+import module.psk16 as psk16
+
+# 噪声流每块的样点数，第k块由跳转k次的PCG64流生成
+DEFAULT_BLOCK = 1 << 16
+
+
+def AWGN(in_data,amp,rng=None):
     '''
     Apply AWGN to the input signal
     
@@ -9,6 +17,13 @@ def AWGN(in_data,amp):
     in_data: ndarray(n) 
         16PSK modulated signal
 
+    amp: float
+        standard deviation of the noise
+
+    rng: numpy.random.Generator, optional
+        noise source, the global numpy random state if not given; a float32
+        signal gets float32 noise from it
+
     Returns
     -----------
     out_data: ndarray(n)
@@ -18,7 +33,446 @@ def AWGN(in_data,amp):
     '''
 
     length = len(in_data)
-    noise = amp*np.random.randn(length)
+    if rng is None:
+        noise = amp*np.random.randn(length)
+    else:
+        noise = rng.standard_normal(length, dtype=_noise_dtype(in_data))
+        noise *= amp
     data_n = in_data + noise
 
-    return data_n
\ No newline at end of file
+    return data_n
+
+
+def AWGN_baseband(in_data,amp,N,ratio,rng=None):
+    '''
+    Apply to complex baseband symbols the noise `AWGN` would leave after
+    correlation demodulation
+
+    The correlator sums carrier_n[k]*noise over the ratio*N samples of a
+    symbol, with i.i.d. noise of standard deviation amp this is a zero mean
+    Gaussian vector of covariance amp**2*ratio*G, G = `psk16.carrier_gram(N)`.
+    The noise is drawn with exactly that covariance, so the decisions of
+    `psk16_baseband_demodulate` have the same distribution as those of the
+    passband link.
+
+    Parameters
+    -----------
+    in_data: ndarray(n), complex
+        baseband symbols from `psk16.psk16_baseband_modulate`
+
+    amp: float
+        standard deviation of the passband noise
+
+    N: int
+        data per analog period
+
+    ratio: int
+        carrier periods per symbol (fc/fs)
+
+    rng: numpy.random.Generator, optional
+        noise source, the global numpy random state if not given; complex64
+        symbols get float32 noise from it
+
+    Returns
+    -----------
+    out_data: ndarray(n), complex
+        noised baseband symbols
+    '''
+    length = len(in_data)
+    if rng is None:
+        z = np.random.randn(2,length)
+    else:
+        z = rng.standard_normal((2,length), dtype=_noise_dtype(in_data.real))
+
+    # 按协方差矩阵的Cholesky分解生成相关的同相与正交噪声
+    L = np.linalg.cholesky(amp**2*ratio*psk16.carrier_gram(N)).astype(z.dtype)
+    noise = L @ z
+    out_data = in_data.copy()
+    out_data.real += noise[0]
+    out_data.imag += noise[1]
+    return out_data
+
+
+def _noise_dtype(in_data):
+    return np.float32 if in_data.dtype == np.float32 else np.float64
+
+
+def symbol_energy(N,ratio):
+    '''
+    Average energy of one 16PSK symbol of `psk16_modulate`
+
+    The sampled carrier of a period is not exactly orthogonal, so the
+    energy is averaged over the 16 constellation points instead of taken as
+    `ratio*N/2`.
+    '''
+    symbols = np.unpackbits(np.arange(16, dtype=np.uint8)[:,np.newaxis], axis=1)[:,4:]
+    signal = psk16.psk16_modulate_fast(symbols.reshape(-1), ratio, 1, N)
+    return float(np.sum(signal**2)/16)
+
+
+def ebn0_to_amp(ebn0_db,N,ratio,bits_per_symbol=4):
+    '''
+    Noise gain of `AWGN` giving the Eb/N0 (dB), Eb being the energy per
+    information bit when a symbol carries `bits_per_symbol` of them
+
+    The per-sample noise variance amp**2 is N0/2.
+    '''
+    ebn0 = 10**(ebn0_db/10)
+    eb = symbol_energy(N, ratio)/bits_per_symbol
+    return math.sqrt(eb/(2*ebn0))
+
+
+def snr_to_amp(snr_db,N,ratio):
+    '''
+    Noise gain of `AWGN` giving the per-sample signal to noise ratio (dB)
+    '''
+    power = symbol_energy(N, ratio)/(ratio*N)
+    return math.sqrt(power/10**(snr_db/10))
+
+
+class NoiseStream:
+    '''
+    Reproducible standard normal samples addressed by absolute position
+
+    The stream is cut into blocks of `block` samples, block k is drawn from
+    the PCG64 generator of `seed` jumped k times. The samples at a given
+    position therefore do not depend on how the stream is read: at once,
+    in chunks, or by several processes.
+
+    Parameters
+    -----------
+    seed: int, numpy.random.SeedSequence or None
+        seed of the stream
+
+    block: int
+        number of samples per block
+
+    dtype: numpy dtype
+        float32 or float64, the two give different samples
+    '''
+    __slots__ = ('seed', 'block', 'dtype', '_index', '_cache')
+
+    def __init__(self,seed=None,block=DEFAULT_BLOCK,dtype=np.float64):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed = seed
+        self.block = block
+        self.dtype = np.dtype(dtype)
+        self._index = -1
+        self._cache = None
+
+    def __reduce__(self):
+        return (NoiseStream, (self.seed, self.block, self.dtype))
+
+    def _block(self,k):
+        if self._index != k:
+            if self._cache is None:
+                self._cache = np.empty(self.block, dtype=self.dtype)
+            bitgen = np.random.PCG64(self.seed).jumped(k)
+            np.random.Generator(bitgen).standard_normal(dtype=self.dtype, out=self._cache)
+            self._index = k
+        return self._cache
+
+    def normal(self,start,length,out=None):
+        '''
+        Samples [start, start+length) of the stream, written to `out` if given
+        '''
+        if out is None:
+            out = np.empty(length, dtype=self.dtype)
+        position = 0
+        while position < length:
+            k, offset = divmod(start + position, self.block)
+            count = min(self.block - offset, length - position)
+            out[position:position+count] = self._block(k)[offset:offset+count]
+            position += count
+        return out
+
+    def add_normal(self,start,out,scale=1.0):
+        '''
+        Add `scale` times the samples [start, start+len(out)) of the stream
+        to `out` in place, one block at a time
+        '''
+        length = len(out)
+        scale = out.dtype.type(scale)
+        # 按块缩放后累加，不生成整段噪声
+        scratch = np.empty(min(self.block, length), dtype=out.dtype)
+        position = 0
+        while position < length:
+            k, offset = divmod(start + position, self.block)
+            count = min(self.block - offset, length - position)
+            noise = np.multiply(self._block(k)[offset:offset+count], scale, out=scratch[:count])
+            out[position:position+count] += noise
+            position += count
+        return out
+
+
+class ChannelModel:
+    '''
+    Base class of the channel models
+
+    A model is applied to a block of a passband signal (real, sampled
+    waveform of `psk16_modulate`) or of complex baseband symbols (from
+    `psk16.psk16_baseband_modulate`) with `model(signal, start)`, `start`
+    being the absolute position of the block (in samples, or in symbols for
+    baseband blocks). Random models draw from `NoiseStream`s, so a signal
+    gets the same channel whether it is processed at once or in blocks.
+    The block is copied, unless `model(signal, start, inplace=True)` is
+    used to apply the channel in place on a writeable floating point block
+    the caller does not need anymore.
+    '''
+    __slots__ = ()
+
+    def passband(self,signal,start=0):
+        raise NotImplementedError
+
+    def baseband(self,symbols,start=0):
+        raise NotImplementedError
+
+    def __call__(self,signal,start=0,inplace=False):
+        floating = np.iscomplexobj(signal) or np.issubdtype(signal.dtype, np.floating)
+        if not inplace or not floating or not signal.flags.writeable:
+            # 整数信号转换为float64，其余复制一份，不修改调用者的数组
+            signal = signal.astype(signal.dtype if floating else np.float64)
+        if np.iscomplexobj(signal):
+            return self.baseband(signal, start)
+        return self.passband(signal, start)
+
+
+class AWGNChannel(ChannelModel):
+    '''
+    Additive white Gaussian noise of standard deviation `amp` per sample
+
+    Parameters
+    -----------
+    amp: float
+        standard deviation of the noise, as in `AWGN`
+
+    N: int
+        data per analog period, needed for baseband symbols
+
+    ratio: int
+        carrier periods per symbol (fc/fs), needed for baseband symbols
+
+    seed: int, numpy.random.SeedSequence or None
+        seed of the noise
+    '''
+    __slots__ = ('amp', 'N', 'ratio', 'seed', '_streams')
+
+    def __init__(self,amp,N=None,ratio=None,seed=None):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.amp = amp
+        self.N = N
+        self.ratio = ratio
+        self.seed = seed
+        self._streams = {}
+
+    def __reduce__(self):
+        return (AWGNChannel, (self.amp, self.N, self.ratio, self.seed))
+
+    @classmethod
+    def from_snr(cls,snr_db,N,ratio,seed=None):
+        '''
+        Noise set by the per-sample signal to noise ratio in dB
+        '''
+        return cls(snr_to_amp(snr_db, N, ratio), N, ratio, seed)
+
+    @classmethod
+    def from_ebn0(cls,ebn0_db,N,ratio,bits_per_symbol=4,seed=None):
+        '''
+        Noise set by Eb/N0 in dB, see `ebn0_to_amp`
+        '''
+        return cls(ebn0_to_amp(ebn0_db, N, ratio, bits_per_symbol), N, ratio, seed)
+
+    def _stream(self,dtype,component=0):
+        # 通带噪声与基带的两路噪声使用种子的不同子序列
+        key = (np.dtype(dtype), component)
+        if key not in self._streams:
+            children = np.random.SeedSequence(self.seed.entropy, spawn_key=self.seed.spawn_key + (component,))
+            self._streams[key] = NoiseStream(children, dtype=dtype)
+        return self._streams[key]
+
+    def passband(self,signal,start=0):
+        return self._stream(signal.dtype).add_normal(start, signal, self.amp)
+
+    def baseband(self,symbols,start=0):
+        dtype = symbols.real.dtype
+        z = np.empty((2,len(symbols)), dtype=dtype)
+        self._stream(dtype, 1).normal(start, len(symbols), out=z[0])
+        self._stream(dtype, 2).normal(start, len(symbols), out=z[1])
+        # 与AWGN_baseband相同的相关噪声
+        L = np.linalg.cholesky(self.amp**2*self.ratio*psk16.carrier_gram(self.N))
+        noise = (L @ z).astype(dtype, copy=False)
+        symbols.real += noise[0]
+        symbols.imag += noise[1]
+        return symbols
+
+
+class FlatChannel(ChannelModel):
+    '''
+    Base class of the flat (per symbol) multiplicative channels
+
+    Each symbol [a,b] of the link is multiplied by a complex gain h as
+    (a+jb)*h. On a passband block the symbols are recovered from the
+    waveform by projection on the local carrier, which is exact for the
+    output of `psk16_modulate`, so these models must be applied before the
+    noise. Passband blocks must start on a symbol boundary.
+
+    Parameters
+    -----------
+    N: int
+        data per analog period
+
+    ratio: int
+        carrier periods per symbol (fc/fs)
+    '''
+    __slots__ = ('N', 'ratio')
+
+    def __init__(self,N,ratio):
+        self.N = N
+        self.ratio = ratio
+
+    def gains(self,start,length):
+        '''
+        Complex gains of the symbols [start, start+length)
+        '''
+        raise NotImplementedError
+
+    def passband(self,signal,start=0):
+        period = self.ratio*self.N
+        if start % period:
+            raise ValueError('passband block must start on a symbol boundary')
+        length = len(signal)//period
+        carrier = psk16._carrier(self.N)
+        gram = psk16.carrier_gram(self.N)
+
+        x = signal[:length*period].reshape(length, self.ratio, self.N)
+        # 由波形投影求出每个码元的同相与正交分量
+        ai_data = np.linalg.solve(gram, (x.sum(axis=1) @ carrier).T/self.ratio)
+        symbols = (ai_data[0] + 1j*ai_data[1])*self.gains(start//period, length)
+        period_wave = np.outer(symbols.real, carrier[:,0]) + np.outer(symbols.imag, carrier[:,1])
+        x[...] = period_wave[:,np.newaxis,:]
+        return signal
+
+    def baseband(self,symbols,start=0):
+        gram = psk16.carrier_gram(self.N)
+        r = np.stack([symbols.real, symbols.imag])
+        ai_data = np.linalg.solve(gram, r/self.ratio)
+        faded = (ai_data[0] + 1j*ai_data[1])*self.gains(start, len(symbols))
+        r = self.ratio*(gram @ np.stack([faded.real, faded.imag]))
+        symbols.real = r[0]
+        symbols.imag = r[1]
+        return symbols
+
+
+class PhaseOffset(FlatChannel):
+    '''
+    Constant carrier phase offset `phase` (rad)
+    '''
+    __slots__ = ('phase',)
+
+    def __init__(self,phase,N,ratio):
+        super().__init__(N, ratio)
+        self.phase = phase
+
+    def gains(self,start,length):
+        return np.full(length, np.exp(1j*self.phase))
+
+
+class FrequencyOffset(FlatChannel):
+    '''
+    Carrier frequency offset of `offset` cycles per symbol (delta_f/fs),
+    the phase is held constant over each symbol
+    '''
+    __slots__ = ('offset', 'phase')
+
+    def __init__(self,offset,N,ratio,phase=0.0):
+        super().__init__(N, ratio)
+        self.offset = offset
+        self.phase = phase
+
+    def gains(self,start,length):
+        index = start + np.arange(length)
+        return np.exp(1j*(self.phase + 2*math.pi*self.offset*index))
+
+
+class RicianChannel(FlatChannel):
+    '''
+    Rician flat fading with factor `K` and unit mean power, the gain is
+    constant over blocks of `coherence` symbols; K=0 is Rayleigh fading
+
+    Parameters
+    -----------
+    K: float
+        power ratio of the line of sight and scattered components
+
+    N: int
+        data per analog period
+
+    ratio: int
+        carrier periods per symbol (fc/fs)
+
+    coherence: int
+        number of symbols sharing one gain
+
+    seed: int, numpy.random.SeedSequence or None
+        seed of the fading process
+    '''
+    __slots__ = ('K', 'coherence', 'seed', '_streams')
+
+    def __init__(self,K,N,ratio,coherence=1,seed=None):
+        super().__init__(N, ratio)
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.K = K
+        self.coherence = coherence
+        self.seed = seed
+        self._streams = [NoiseStream(child) for child in
+                         [np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (k,)) for k in (0, 1)]]
+
+    def __reduce__(self):
+        return (type(self), (self.K, self.N, self.ratio, self.coherence, self.seed))
+
+    def gains(self,start,length):
+        if length == 0:
+            return np.zeros(0, dtype=complex)
+        index = (start + np.arange(length))//self.coherence
+        first = index[0]
+        count = index[-1] - first + 1
+        scatter = (self._streams[0].normal(first, count) + 1j*self._streams[1].normal(first, count))/math.sqrt(2)
+        h = math.sqrt(self.K/(self.K+1)) + math.sqrt(1/(self.K+1))*scatter
+        return h[index - first]
+
+
+class RayleighChannel(RicianChannel):
+    '''
+    Rayleigh flat fading with unit mean power, the gain is constant over
+    blocks of `coherence` symbols
+    '''
+    __slots__ = ()
+
+    def __init__(self,N,ratio,coherence=1,seed=None):
+        super().__init__(0.0, N, ratio, coherence, seed)
+
+    def __reduce__(self):
+        return (RayleighChannel, (self.N, self.ratio, self.coherence, self.seed))
+
+
+class CompositeChannel(ChannelModel):
+    '''
+    Models applied one after the other, e.g. fading, phase offset, noise
+    '''
+    __slots__ = ('models',)
+
+    def __init__(self,*models):
+        self.models = models
+
+    def passband(self,signal,start=0):
+        for model in self.models:
+            signal = model.passband(signal, start)
+        return signal
+
+    def baseband(self,symbols,start=0):
+        for model in self.models:
+            symbols = model.baseband(symbols, start)
+        return symbols
\ No newline at end of file
@@ -1,35 +1,52 @@
+import functools
+
 import numpy as np
 
+from module.bitstream import Bitstream, as_bits, like
+
+# (12,8)码的生成矩阵
+GENERATE = np.array(
+    [[1,0,0,0,0,0,0,0,1,1,1,0],
+    [0,1,0,0,0,0,0,0,1,0,0,1],
+    [0,0,1,0,0,0,0,0,0,1,0,1],
+    [0,0,0,1,0,0,0,0,1,1,0,1],
+    [0,0,0,0,1,0,0,0,0,0,1,1],
+    [0,0,0,0,0,1,0,0,1,0,1,1],
+    [0,0,0,0,0,0,1,0,0,1,1,1],
+    [0,0,0,0,0,0,0,1,1,1,1,1]]
+)
+
+# (12,8)码的监督矩阵
+SUPERVISION = np.array(
+    [[1,1,0,1,0,1,0,1,1,0,0,0],
+    [1,0,1,1,0,0,1,1,0,1,0,0],
+    [1,0,0,0,1,1,1,1,0,0,1,0],
+    [0,1,1,1,1,1,1,1,0,0,0,1]]
+)
+
+# 软判决译码每批处理的码字数，限制度量矩阵的内存
+SOFT_BLOCK = 4096
+
 def correction_en(in_data):
     """
     Apply (12,8) correction encoding to the input signal
 
     Parameters
     -----------
-    in_data: ndarray(n) 
-        correction encoded signal
+    in_data: ndarray(n) or Bitstream
+        PCM encoded signal
 
     Returns
     -----------
-    out_data: ndarray(n)
-        correction encoded signal
+    out_data: ndarray(n*12/8) or Bitstream
+        correction encoded signal, packed if the input is packed
     
     Author
     ----------
     By SCUT Zening Lin, Yushu Li, Qiheng Tan, Qingfeng Wang on 2020-01-06
     """
-    generate = np.array(
-        [[1,0,0,0,0,0,0,0,1,1,1,0],
-        [0,1,0,0,0,0,0,0,1,0,0,1],
-        [0,0,1,0,0,0,0,0,0,1,0,1],
-        [0,0,0,1,0,0,0,0,1,1,0,1],
-        [0,0,0,0,1,0,0,0,0,0,1,1],
-        [0,0,0,0,0,1,0,0,1,0,1,1],
-        [0,0,0,0,0,0,1,0,0,1,1,1],
-        [0,0,0,0,0,0,0,1,1,1,1,1]]
-    )
-
-
+    packed_in = in_data
+    in_data = as_bits(in_data)
     length = len(in_data)//8
     in_data = in_data.reshape(length,8)
     in_data_grey = np.zeros((length,8))
@@ -45,7 +62,7 @@ def correction_en(in_data):
             else:
                 in_data_grey[i][j] = 1
 
-        out_data[i] = np.matmul(in_data_grey[i],generate)
+        out_data[i] = np.matmul(in_data_grey[i],GENERATE)
     
     out_data = out_data.reshape(length*12)
     
@@ -56,7 +73,7 @@ def correction_en(in_data):
         else:
             out_data[i] = 1
 
-    return out_data
+    return like(out_data, packed_in)
 
 
 
@@ -66,26 +83,21 @@ def correction_de(in_data):
 
     Parameters
     -----------
-    in_data: ndarray(n) 
+    in_data: ndarray(n) or Bitstream
         correction encoded signal
 
     Returns
     -----------
-    out_data: ndarray(n)
-        correction decoded signal
+    out_data: ndarray(n*8/12) or Bitstream
+        correction decoded signal, packed if the input is packed
     
     Author
     ----------
     By SCUT Zening Lin, Yushu Li, Qiheng Tan, Qingfeng Wang on 2020-01-06
     """
 
-    supervision = np.array(
-        [[1,1,0,1,0,1,0,1,1,0,0,0],
-        [1,0,1,1,0,0,1,1,0,1,0,0],
-        [1,0,0,0,1,1,1,1,0,0,1,0],
-        [0,1,1,1,1,1,1,1,0,0,0,1]]
-    )
-
+    packed_in = in_data
+    in_data = as_bits(in_data)
     length = len(in_data)//12
     in_data_grey = in_data.reshape(length,12)
     syndrome = np.zeros(4)
@@ -95,7 +107,7 @@ def correction_de(in_data):
     # 格雷码译码
     for i in range(length):
         error_pattern = np.zeros(12)
-        syndrome = np.transpose(np.matmul(supervision, np.transpose(in_data_grey[i])))
+        syndrome = np.transpose(np.matmul(SUPERVISION, np.transpose(in_data_grey[i])))
         for j in range(4):
             if syndrome[j]%2 == 0:
                 syndrome[j] = 0
@@ -150,8 +162,271 @@ def correction_de(in_data):
             else:
                 out_data_bin[i][j] = 1
     
-    return out_data_bin.reshape(length*8)
+    return like(out_data_bin.reshape(length*8), packed_in)
+
+
+
+@functools.lru_cache(maxsize=None)
+def _error_pattern_table():
+    """
+    Build the 16-entry table mapping a syndrome (MSB first) to the error
+    pattern corrected by `correction_de`
+    """
+    table = np.zeros((16,12), dtype=np.uint8)
+    # 单比特错误的伴随式即为监督矩阵的对应列
+    weights = np.array([8,4,2,1])
+    for j in range(12):
+        table[weights @ SUPERVISION[:,j], j] = 1
+    # 其余三个伴随式按监督位上的双比特错误纠正
+    table[0b1100, [8,9]] = 1
+    table[0b1010, [8,10]] = 1
+    table[0b0110, [9,10]] = 1
+    table.flags.writeable = False
+    return table
+
+
+def correction_en_fast(in_data):
+    """
+    Apply (12,8) correction encoding to the input signal, vectorized
+
+    Gray pre-coding is an XOR of neighbouring bits and the generator
+    product is one GF(2) matrix product over the whole block, the output is
+    bit-identical to `correction_en`.
+
+    Parameters
+    -----------
+    in_data: ndarray(n) or Bitstream
+        PCM encoded signal
+
+    Returns
+    -----------
+    out_data: ndarray(n*12/8), uint8 or Bitstream
+        correction encoded signal, packed if the input is packed
+    """
+    bits = np.asarray(as_bits(in_data, np.uint8), dtype=np.uint8)
+    length = len(bits)//8
+    bits = bits[:length*8].reshape(length,8)
+
+    # 格雷码编码
+    grey = bits.copy()
+    np.bitwise_xor(bits[:,1:], bits[:,:-1], out=grey[:,1:])
+
+    # 模二矩阵乘法
+    out_data = np.matmul(grey, GENERATE.astype(np.uint8))
+    out_data &= 1
+
+    return like(out_data.reshape(length*12), in_data)
+
+
+def correction_de_fast(in_data):
+    """
+    Apply (12,8) correction decoding to the input signal, vectorized
+
+    The syndromes of all codewords are computed with one GF(2) matrix
+    product, looked up in a 16-entry error pattern table and corrected with
+    XOR, the output is bit-identical to `correction_de`.
+
+    Parameters
+    -----------
+    in_data: ndarray(n) or Bitstream
+        correction encoded signal
+
+    Returns
+    -----------
+    out_data: ndarray(n*8/12), uint8 or Bitstream
+        correction decoded signal, packed if the input is packed
+    """
+    bits = np.asarray(as_bits(in_data, np.uint8), dtype=np.uint8)
+    length = len(bits)//12
+    bits = bits[:length*12].reshape(length,12)
+
+    # 伴随式计算
+    syndrome = np.matmul(bits, SUPERVISION.T.astype(np.uint8))
+    syndrome &= 1
+    syndrome = syndrome @ np.array([8,4,2,1], dtype=np.uint8)
+
+    # 查表纠错
+    corrected = bits[:,:8] ^ _error_pattern_table()[syndrome,:8]
+
+    # 格雷码译码
+    out_data = np.bitwise_xor.accumulate(corrected, axis=1)
+
+    return like(out_data.reshape(length*8), in_data)
+
+
+
+@functools.lru_cache(maxsize=None)
+def _codeword_table():
+    """
+    Build the 256-entry table mapping a message byte (MSB first) to its
+    12-bit codeword, Gray pre-coding included
+    """
+    messages = np.unpackbits(np.arange(256, dtype=np.uint8))
+    words = correction_en_fast(messages).reshape(256,12)
+    table = (words @ (1 << np.arange(11,-1,-1))).astype(np.uint16)
+    table.flags.writeable = False
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def _codeword_pair_table():
+    """
+    Build the 65536-entry table mapping two message bytes to their two
+    codewords packed into three bytes
+    """
+    words = _codeword_table()[np.arange(65536).reshape(-1,1) >> np.array([8,0]) & 255]
+    table = _pack12(words.reshape(-1)).reshape(65536,3)
+    table.flags.writeable = False
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def _word_decode_table():
+    """
+    Build the 4096-entry table mapping a received 12-bit word to the
+    corrected message byte
+    """
+    words = np.arange(4096)
+    bits = ((words[:,None] >> np.arange(11,-1,-1)) & 1).astype(np.uint8)
+    table = np.packbits(correction_de_fast(bits.reshape(-1)))
+    table.flags.writeable = False
+    return table
+
+
+def _pack12(words):
+    """
+    Pack 12-bit words MSB first, two words into three bytes
+    """
+    length = len(words)
+    if length % 2:
+        words = np.append(words, np.uint16(0))
+    pairs = words.reshape(-1,2)
+    out_data = np.empty((len(pairs),3), dtype=np.uint8)
+    out_data[:,0] = pairs[:,0] >> 4
+    out_data[:,1] = ((pairs[:,0] & 15) << 4) | (pairs[:,1] >> 8)
+    out_data[:,2] = pairs[:,1] & 255
+    return out_data.reshape(-1)[:(12*length+7)//8]
+
+
+def _unpack12(data, length):
+    """
+    Unpack `length` 12-bit words from bytes packed by `_pack12`
+    """
+    nbytes = 3*((length+1)//2)
+    if len(data) < nbytes:
+        data = np.concatenate([data, np.zeros(nbytes-len(data), dtype=np.uint8)])
+    triples = data[:nbytes].reshape(-1,3).astype(np.uint16)
+    words = np.empty((len(triples),2), dtype=np.uint16)
+    words[:,0] = (triples[:,0] << 4) | (triples[:,1] >> 4)
+    words[:,1] = ((triples[:,1] & 15) << 8) | triples[:,2]
+    return words.reshape(-1)[:length]
+
+
+def correction_en_table(in_data):
+    """
+    Apply (12,8) correction encoding to the input signal with a single
+    table gather per pair of message bytes
+
+    Parameters
+    -----------
+    in_data: ndarray(n) or Bitstream
+        PCM encoded signal
+
+    Returns
+    -----------
+    out_data: ndarray(n*12/8), uint8 or Bitstream
+        correction encoded signal, packed if the input is packed
+    """
+    stream = in_data if isinstance(in_data, Bitstream) else Bitstream.from_bits(in_data)
+    length = stream.length//8
+    pairs = length//2
+
+    # 每两个信息字节查表得到两个码字共三个字节
+    data = np.ascontiguousarray(stream.data[:2*pairs])
+    out_data = np.take(_codeword_pair_table(), data.view('>u2'), axis=0).reshape(-1)
+    if length % 2:
+        out_data = np.concatenate([out_data, _pack12(_codeword_table()[stream.data[length-1:length]])])
+    out_data = Bitstream(out_data, 12*length)
+
+    if isinstance(in_data, Bitstream):
+        return out_data
+    return out_data.to_bits()
+
+
+def correction_de_table(in_data):
+    """
+    Apply (12,8) correction decoding to the input signal with a single
+    table gather per received word
+
+    Parameters
+    -----------
+    in_data: ndarray(n) or Bitstream
+        correction encoded signal
+
+    Returns
+    -----------
+    out_data: ndarray(n*8/12), uint8 or Bitstream
+        correction decoded signal, packed if the input is packed
+    """
+    stream = in_data if isinstance(in_data, Bitstream) else Bitstream.from_bits(in_data)
+    length = stream.length//12
+
+    words = _unpack12(stream.data, length)
+    out_data = Bitstream(np.take(_word_decode_table(), words), 8*length)
+
+    if isinstance(in_data, Bitstream):
+        return out_data
+    return out_data.to_bits()
+
+
+@functools.lru_cache(maxsize=None)
+def _codeword_signs():
+    """
+    Build the 256x12 table of the codewords in antipodal form, +1 for a 0
+    bit and -1 for a 1 bit, row k being the codeword of message byte k
+    """
+    words = _codeword_table()
+    bits = (words[:,None] >> np.arange(11,-1,-1)) & 1
+    table = (1 - 2*bits).astype(np.float64)
+    table.flags.writeable = False
+    return table
+
+
+def correction_de_soft(in_data,packed=False):
+    """
+    Apply maximum likelihood soft-input (12,8) correction decoding
+
+    Each block of 12 bit LLRs is correlated with the antipodal form of the
+    256 codewords in one matrix product and decoded to the message of the
+    best scoring codeword. With LLRs this is the maximum likelihood
+    decision, with hard +-1 inputs it is minimum distance decoding.
+
+    Parameters
+    -----------
+    in_data: ndarray(n)
+        bit LLRs of the correction encoded signal, positive for a 0 bit
+
+    packed: bool
+        return the decoded bits as a Bitstream
+
+    Returns
+    -----------
+    out_data: ndarray(n*8/12), uint8 or Bitstream
+        correction decoded signal
+    """
+    length = len(in_data)//12
+    llr = np.asarray(in_data[:length*12]).reshape(length,12)
+    signs = _codeword_signs().astype(llr.dtype if llr.dtype == np.float32 else np.float64)
+    out_data = np.empty(length, dtype=np.uint8)
+
+    for i in range(0, length, SOFT_BLOCK):
+        score = llr[i:i+SOFT_BLOCK] @ signs.T
+        out_data[i:i+SOFT_BLOCK] = np.argmax(score, axis=1)
 
+    out_data = Bitstream(out_data, 8*length)
+    if packed:
+        return out_data
+    return out_data.to_bits()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,291 @@
+import functools
+
+import numpy as np
+
+from module.bitstream import Bitstream
+
+
+@functools.lru_cache(maxsize=None)
+def _block_permutation(rows, cols, inverse=False):
+    """
+    Read order of a rows x cols block: written row by row and read column
+    by column, or the inverse permutation
+    """
+    permutation = np.arange(rows*cols).reshape(rows, cols).T.reshape(-1)
+    if inverse:
+        permutation = np.argsort(permutation)
+    permutation.flags.writeable = False
+    return permutation
+
+
+@functools.lru_cache(maxsize=256)
+def _convolutional_index(branches, depth, inverse, phase, length):
+    """
+    Gather indices of `length` outputs of a convolutional interleaver into
+    the history of its input followed by the new block, the first output
+    being on branch `phase`
+    """
+    history = (branches-1)*depth*branches
+    branch = (phase + np.arange(length)) % branches
+    if inverse:
+        branch = branches - 1 - branch
+    index = history + np.arange(length) - branch*depth*branches
+    index.flags.writeable = False
+    return index
+
+
+def _unpacked(in_data):
+    """
+    Bits of a Bitstream, or the input ndarray (bits or LLRs) unchanged
+    """
+    if isinstance(in_data, Bitstream):
+        return in_data.to_bits()
+    return np.asarray(in_data)
+
+
+def _repacked(out_data, in_data):
+    """
+    Pack the output like the input was
+    """
+    if isinstance(in_data, Bitstream):
+        return Bitstream.from_bits(out_data)
+    return out_data
+
+
+class BlockInterleaver:
+    """
+    Block interleaver of `rows` x `cols` bits
+
+    Bits are written into the block row by row and read column by column,
+    so bits adjacent at the input are `rows` positions apart at the output.
+    With `cols` = 12 and `rows` codewords, the bits of a (12,8) codeword
+    are spread over 12 different 16PSK symbols as soon as `rows` >= 4.
+    Blocks are permuted with one gather through a precomputed index array,
+    a block is output once complete, so the latency is one block. The bits
+    of an incomplete last block are passed unchanged by `flush`, the
+    stream keeps its length.
+
+    Parameters
+    -----------
+    rows: int
+        number of rows of the block
+
+    cols: int
+        number of columns of the block
+
+    inverse: bool
+        deinterleave instead of interleave
+    """
+    __slots__ = ('rows', 'cols', 'inverse', '_pending')
+
+    def __init__(self, rows, cols, inverse=False):
+        self.rows = rows
+        self.cols = cols
+        self.inverse = inverse
+        self.reset()
+
+    def __repr__(self):
+        return 'BlockInterleaver(%d, %d, inverse=%r)' % (self.rows, self.cols, self.inverse)
+
+    @property
+    def size(self):
+        return self.rows*self.cols
+
+    @property
+    def overhead(self):
+        """
+        Number of bits added to the stream, none
+        """
+        return 0
+
+    def inverted(self):
+        """
+        Matching deinterleaver (or interleaver), with a fresh state
+        """
+        return BlockInterleaver(self.rows, self.cols, not self.inverse)
+
+    def reset(self):
+        """
+        Drop the buffered bits to start a new stream
+        """
+        self._pending = None
+
+    def process(self, in_data):
+        """
+        Permute the next block of the stream
+
+        Parameters
+        -----------
+        in_data: ndarray(n) or Bitstream
+            bits, or bit LLRs on the receiving side
+
+        Returns
+        -----------
+        out_data: ndarray(m) or Bitstream
+            the complete blocks available so far, packed if the input is
+        """
+        data = _unpacked(in_data)
+        if self._pending is not None and len(self._pending):
+            data = np.concatenate([self._pending, data])
+        count = len(data)//self.size
+
+        # 一次按预先计算的索引整块重排
+        out_data = np.empty(count*self.size, dtype=data.dtype)
+        permutation = _block_permutation(self.rows, self.cols, self.inverse)
+        np.take(data[:count*self.size].reshape(count, self.size), permutation, axis=1,
+                out=out_data.reshape(count, self.size))
+        self._pending = data[count*self.size:].copy()
+        return _repacked(out_data, in_data)
+
+    def flush(self):
+        """
+        Bits of the incomplete last block, unchanged
+        """
+        out_data = self._pending if self._pending is not None else np.zeros(0, dtype=np.uint8)
+        self._pending = None
+        return out_data
+
+
+class ConvolutionalInterleaver:
+    """
+    Convolutional (Forney) interleaver of `branches` branches
+
+    Bit n of the stream goes through branch n % branches, branch i delays
+    its bits by i*depth*branches positions (the deinterleaver by
+    (branches-1-i)*depth*branches), so the end to end delay is
+    (branches-1)*depth*branches bits for about half the memory of a block
+    interleaver of the same spread. Each block is produced by one gather
+    through a precomputed index array into the kept history of the input.
+
+    The interleaver outputs as many bits as it receives, `flush` then
+    drains the `overhead` bits still in its branches; the deinterleaver
+    drops the first `overhead` bits it outputs (the fill of the branches),
+    so a stream of n bits comes out of the pair as the same n bits.
+
+    Parameters
+    -----------
+    branches: int
+        number of branches
+
+    depth: int
+        delay step between branches, in multiples of `branches`
+
+    inverse: bool
+        deinterleave instead of interleave
+    """
+    __slots__ = ('branches', 'depth', 'inverse', '_history', '_position', '_skip')
+
+    def __init__(self, branches, depth=1, inverse=False):
+        self.branches = branches
+        self.depth = depth
+        self.inverse = inverse
+        self.reset()
+
+    def __repr__(self):
+        return 'ConvolutionalInterleaver(%d, %d, inverse=%r)' % (self.branches, self.depth, self.inverse)
+
+    @property
+    def overhead(self):
+        """
+        End to end delay of the interleaver pair in bits, added to the
+        stream by `flush` of the interleaver
+        """
+        return (self.branches-1)*self.depth*self.branches
+
+    def inverted(self):
+        """
+        Matching deinterleaver (or interleaver), with a fresh state
+        """
+        return ConvolutionalInterleaver(self.branches, self.depth, not self.inverse)
+
+    def reset(self):
+        """
+        Empty the branches to start a new stream
+        """
+        self._history = None
+        self._position = 0
+        self._skip = self.overhead if self.inverse else 0
+
+    def process(self, in_data):
+        """
+        Pass the next block of the stream through the branches
+
+        Parameters
+        -----------
+        in_data: ndarray(n) or Bitstream
+            bits, or bit LLRs on the receiving side
+
+        Returns
+        -----------
+        out_data: ndarray(m) or Bitstream
+            output bits, packed if the input is
+        """
+        data = _unpacked(in_data)
+        length = len(data)
+        if self._history is None:
+            # 支路初始为0(软判决时为对数似然比0)
+            self._history = np.zeros(self.overhead, dtype=data.dtype)
+        buffered = np.concatenate([self._history, data])
+
+        index = _convolutional_index(self.branches, self.depth, self.inverse,
+                                     self._position % self.branches, length)
+        out_data = np.take(buffered, index)
+        self._history = buffered[len(buffered)-self.overhead:]
+        self._position += length
+
+        skip = min(self._skip, length)
+        self._skip -= skip
+        return _repacked(out_data[skip:], in_data)
+
+    def flush(self):
+        """
+        Drain the branches: the last `overhead` bits for the interleaver,
+        nothing for the deinterleaver
+        """
+        dtype = self._history.dtype if self._history is not None else np.uint8
+        if self.inverse:
+            return np.zeros(0, dtype=dtype)
+        return self.process(np.zeros(self.overhead, dtype=dtype))
+
+
+def interleave(in_data, interleaver):
+    """
+    Pass a whole stream through an interleaver or deinterleaver
+
+    Parameters
+    -----------
+    in_data: ndarray(n) or Bitstream
+        bits, or bit LLRs on the receiving side
+
+    interleaver: BlockInterleaver or ConvolutionalInterleaver
+        interleaver to use, it is reset first
+
+    Returns
+    -----------
+    out_data: ndarray(m) or Bitstream
+        permuted stream, packed if the input is
+    """
+    interleaver.reset()
+    out_data = np.concatenate([_unpacked(interleaver.process(_unpacked(in_data))),
+                               interleaver.flush()])
+    interleaver.reset()
+    return _repacked(out_data, in_data)
+
+
+def deinterleave(in_data, interleaver):
+    """
+    Invert `interleave` for the interleaver `interleaver`
+    """
+    return interleave(in_data, interleaver.inverted())
+
+
+if __name__ == "__main__":
+    # 测试数据：4个(12,8)码字
+    test_array = np.arange(48)
+    block = BlockInterleaver(4, 12)
+    print(interleave(test_array, block))
+    print(deinterleave(interleave(test_array, block), block))
+
+    convolutional = ConvolutionalInterleaver(12)
+    sent = interleave(test_array, convolutional)
+    print(len(sent), deinterleave(sent, convolutional))
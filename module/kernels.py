@@ -0,0 +1,159 @@
+import functools
+import importlib.util
+import math
+
+import numpy as np
+
+import module.correction as correction
+import module.pcm as pcm
+import module.psk16 as psk16
+
+# 是否可用Numba编译，Numba本身在第一次调用核函数时才导入
+AVAILABLE = importlib.util.find_spec('numba') is not None
+
+
+def jit(func):
+    """
+    Compile a kernel with Numba in nopython mode, the machine code is cached
+    on disk next to this file so only the first run pays for compilation.
+    Numba is imported and the kernel compiled (or loaded from the cache)
+    on the first call, so importing this module stays cheap. Without Numba
+    the kernel is returned unchanged (plain Python).
+    """
+    if not AVAILABLE:
+        return func
+    compiled = []
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        if not compiled:
+            import numba
+            compiled.append(numba.njit(cache=True, nogil=True)(func))
+        return compiled[0](*args)
+    wrapper.py_func = func
+    return wrapper
+
+
+# 各核函数使用的常量表
+SEG_START = pcm.SEG_START.astype(np.float64)
+SEG_STEP = pcm.SEG_STEP.astype(np.float64)
+# 生成矩阵与监督矩阵的行，按12位整数表示(最高位为第0位)
+GENERATE_ROWS = (correction.GENERATE @ (1 << np.arange(11,-1,-1))).astype(np.int64)
+SUPERVISION_ROWS = (correction.SUPERVISION @ (1 << np.arange(11,-1,-1))).astype(np.int64)
+ERROR_PATTERNS = (correction._error_pattern_table().astype(np.int64) @ (1 << np.arange(11,-1,-1))).astype(np.int64)
+PHASETAB = np.ascontiguousarray(psk16.PHASETAB)
+
+
+@jit
+def pcm_encode_kernel(in_data, seg_start, seg_step, out_data):
+    """
+    A-law encode normalized samples (in units of 1/4096 of the maximum) into
+    codewords, same comparisons and truncations as `pcm.PCM_encode`
+    """
+    for i in range(len(in_data)):
+        x = in_data[i]
+        mag = abs(x)
+        code = 128 if x > 0 else 0
+        # 段落码：逐段比较起始电平
+        seg = 7
+        while seg > 0 and mag < seg_start[seg]:
+            seg -= 1
+        # 段内码
+        seg_index = int((mag - seg_start[seg]) / seg_step[seg])
+        if seg_index > 15:
+            seg_index = 15
+        out_data[i] = code | (seg << 4) | seg_index
+
+
+@jit
+def correction_encode_kernel(in_data, generate_rows, out_data):
+    """
+    (12,8) encode message bytes into 12-bit codewords, the Gray pre-coding
+    chain of `correction.correction_en` is an XOR with the byte shifted by
+    one bit
+    """
+    for i in range(len(in_data)):
+        message = np.int64(in_data[i])
+        grey = message ^ (message >> 1)
+        word = 0
+        for j in range(8):
+            if (grey >> (7 - j)) & 1:
+                word ^= generate_rows[j]
+        out_data[i] = word
+
+
+@jit
+def correction_decode_kernel(in_data, supervision_rows, error_patterns, out_data):
+    """
+    (12,8) decode 12-bit words into message bytes: syndrome, error pattern
+    lookup and the Gray decoding chain of `correction.correction_de`
+    """
+    for i in range(len(in_data)):
+        word = np.int64(in_data[i])
+        syndrome = 0
+        for k in range(4):
+            parity = 0
+            check = word & supervision_rows[k]
+            while check:
+                parity ^= check & 1
+                check >>= 1
+            syndrome = (syndrome << 1) | parity
+        word ^= error_patterns[syndrome]
+
+        # 格雷码译码，逐位与前一位译码结果异或
+        grey = word >> 4
+        bit = 0
+        message = 0
+        for j in range(8):
+            bit ^= (grey >> (7 - j)) & 1
+            message = (message << 1) | bit
+        out_data[i] = message
+
+
+@jit
+def psk16_modulate_kernel(symbols, phasetab, carrier, ratio, out_data):
+    """
+    16PSK modulate symbol indices, sample by sample as `psk16.psk16_modulate`
+    """
+    N = carrier.shape[0]
+    for i in range(len(symbols)):
+        a = phasetab[symbols[i], 0]
+        b = phasetab[symbols[i], 1]
+        for j in range(N):
+            value = a*carrier[j,0] + b*carrier[j,1]
+            for k in range(ratio):
+                out_data[i*N*ratio + j + k*N] = value
+
+
+@jit
+def psk16_correlate_kernel(in_data, carrier, ratio, out_data):
+    """
+    Correlate each symbol with the local carrier and decide its index, with
+    the accumulation order and angle comparisons of
+    `psk16.psk16_correlated_demodulate`
+    """
+    N = carrier.shape[0]
+    for i in range(len(out_data)):
+        r1 = 0.0
+        r2 = 0.0
+        for j in range(ratio):
+            for k in range(N):
+                r1 += carrier[k,0] * in_data[i*ratio*N + j*N + k]
+                r2 += carrier[k,1] * in_data[i*ratio*N + j*N + k]
+
+        # r1为0时atan(r2/r1)为±pi/2，r1与r2均为0时判为0
+        if r1 == 0:
+            out_data[i] = 3 if r2 > 0 else (11 if r2 < 0 else 0)
+            continue
+        angle_received = math.atan(r2/r1)
+        if r1 < 0:
+            angle_received += math.pi
+        elif r2 < 0:
+            angle_received += 2*math.pi
+        code_dec = 0
+        for k in range(16):
+            angle = math.pi*k/8 + math.pi/16
+            if angle - math.pi/16 <= angle_received and angle_received <= angle + math.pi/16:
+                code_dec = k
+                break
+        out_data[i] = code_dec
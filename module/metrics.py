@@ -0,0 +1,188 @@
+import csv
+import functools
+import json
+import os
+
+import numpy as np
+
+from module.bitstream import Bitstream
+
+
+@functools.lru_cache(maxsize=None)
+def _popcount_table():
+    """
+    Number of set bits of every byte value
+    """
+    table = np.unpackbits(np.arange(256, dtype=np.uint8)[:,np.newaxis], axis=1).sum(axis=1)
+    table = table.astype(np.uint8)
+    table.flags.writeable = False
+    return table
+
+
+def _packed(in_data):
+    """
+    Bitstream of a Bitstream or of an ndarray of bits
+    """
+    if isinstance(in_data, Bitstream):
+        return in_data
+    return Bitstream.from_bits(in_data)
+
+
+def _diff(tx, rx):
+    """
+    XOR of two bit streams of the same length, packed, padding bits zero
+    """
+    tx, rx = _packed(tx), _packed(rx)
+    if tx.length != rx.length:
+        raise ValueError('bit streams differ in length: %d and %d' % (tx.length, rx.length))
+    diff = tx.data ^ rx.data
+    if tx.length % 8:
+        diff[-1] &= (0xff << (8 - tx.length % 8)) & 0xff
+    return diff, tx.length
+
+
+def bit_errors(tx, rx):
+    """
+    Count the bits that differ between two bit streams
+
+    Parameters
+    -----------
+    tx, rx: Bitstream or ndarray(n)
+        sent and received bits
+
+    Returns
+    -----------
+    errors: int
+        number of bit errors
+    """
+    diff, length = _diff(tx, rx)
+    return int(_popcount_table()[diff].sum(dtype=np.int64))
+
+
+def block_errors(tx, rx, size):
+    """
+    Count the blocks of `size` bits containing at least one bit error
+
+    Blocks of 4 bits are 16PSK symbols, blocks of 8 bits PCM codewords and
+    blocks of 12 bits (12,8) codewords. A trailing partial block is ignored.
+
+    Parameters
+    -----------
+    tx, rx: Bitstream or ndarray(n)
+        sent and received bits
+
+    size: int
+        number of bits per block
+
+    Returns
+    -----------
+    errors: int
+        number of blocks in error
+    """
+    diff, length = _diff(tx, rx)
+    count = length//size
+    if size == 4:
+        nibbles = np.stack([diff >> 4, diff & 15], axis=1).reshape(-1)[:count]
+        return int(np.count_nonzero(nibbles))
+    if size % 8 == 0:
+        return int(np.count_nonzero(diff[:count*size//8].reshape(count, size//8).any(axis=1)))
+    bits = np.unpackbits(diff, count=count*size).reshape(count, size)
+    return int(np.count_nonzero(bits.any(axis=1)))
+
+
+def snr_db(reference, signal):
+    """
+    Signal to noise ratio in dB of `signal` against `reference`
+
+    With `signal` the PCM decoded input this is the SQNR of the quantizer,
+    with the received audio the SNR of the whole link.
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    noise = reference - np.asarray(signal, dtype=np.float64)
+    power_noise = np.sum(noise**2)
+    if power_noise == 0:
+        return float('inf')
+    return float(10*np.log10(np.sum(reference**2)/power_noise))
+
+
+def link_metrics(pcm_tx, pcm_rx, coded_tx=None, coded_rx=None,
+                 audio=None, audio_rx=None, audio_quantized=None):
+    """
+    Collect the error statistics of one link run into a flat record
+
+    Parameters
+    -----------
+    pcm_tx, pcm_rx: Bitstream or ndarray(n)
+        PCM bits before coding and after decoding
+
+    coded_tx, coded_rx: Bitstream or ndarray(m), optional
+        (12,8) coded bits before modulation and after demodulation
+
+    audio: ndarray(n/8), optional
+        input signal
+
+    audio_rx: ndarray(n/8), optional
+        decoded signal
+
+    audio_quantized: ndarray(n/8), optional
+        input signal after PCM encoding and decoding only
+
+    Returns
+    -----------
+    record: dict
+        error counts and rates
+    """
+    pcm_tx, pcm_rx = _packed(pcm_tx), _packed(pcm_rx)
+    record = {'bits': pcm_tx.length}
+    record['bit_errors'] = bit_errors(pcm_tx, pcm_rx)
+    record['ber'] = record['bit_errors']/max(1, pcm_tx.length)
+    record['samples'] = pcm_tx.length//8
+    record['sample_errors'] = block_errors(pcm_tx, pcm_rx, 8)
+    record['sample_error_rate'] = record['sample_errors']/max(1, record['samples'])
+
+    if coded_tx is not None and coded_rx is not None:
+        coded_tx, coded_rx = _packed(coded_tx), _packed(coded_rx)
+        record['channel_bits'] = coded_tx.length
+        record['channel_bit_errors'] = bit_errors(coded_tx, coded_rx)
+        record['channel_ber'] = record['channel_bit_errors']/max(1, coded_tx.length)
+        record['symbols'] = coded_tx.length//4
+        record['symbol_errors'] = block_errors(coded_tx, coded_rx, 4)
+        record['ser'] = record['symbol_errors']/max(1, record['symbols'])
+        record['codewords'] = coded_tx.length//12
+        record['codeword_errors'] = block_errors(coded_tx, coded_rx, 12)
+        record['codeword_error_rate'] = record['codeword_errors']/max(1, record['codewords'])
+
+    if audio is not None and audio_rx is not None:
+        record['snr_db'] = snr_db(audio, audio_rx)
+    if audio is not None and audio_quantized is not None:
+        record['sqnr_db'] = snr_db(audio, audio_quantized)
+
+    return record
+
+
+def write_record(record, path):
+    """
+    Write a record to a .json file, or append it as a row to a .csv file
+
+    The header of a .csv file is written when the file is created and fixes
+    its columns: fields of the header missing from the record are left
+    empty, and a record with fields outside the header raises ValueError.
+    """
+    if path.endswith('.csv'):
+        fieldnames = list(record)
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            # 追加时沿用已有表头的列，避免不同字段的记录错位
+            with open(path, newline='') as f:
+                fieldnames = next(csv.reader(f))
+            extra = [key for key in record if key not in fieldnames]
+            if extra:
+                raise ValueError('record fields %s are not in the header of %s' % (extra, path))
+        with open(path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            if not exists:
+                writer.writeheader()
+            writer.writerow(record)
+    else:
+        with open(path, 'w') as f:
+            json.dump(record, f, indent=2)
@@ -0,0 +1,182 @@
+import concurrent.futures
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import module.backend as backend
+import module.channel as channel
+import module.pipeline as pipeline
+import module.psk16 as psk16
+
+# 每个分片的样点数，分片大小与进程数无关以保证结果可复现
+DEFAULT_SHARD = 65536
+
+
+def _attach(name, dtype, length):
+    """
+    Attach to a shared memory block and view it as an ndarray
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray((length,), dtype=dtype, buffer=shm.buf)
+
+
+def _run_shard(task):
+    """
+    Transmit one shard of the signal through the link inside a worker
+
+    Samples are read from and the decoded signal and received codewords
+    are written to shared memory, only the shard bounds and parameters are
+    pickled.
+    """
+    (names, length, start, end, data_max, fs, fc_ratio, N, model,
+     method, mode, chunk, kernel_backend, mapping, dtype) = task
+    backend.set_backend(kernel_backend)
+
+    shm_in, data_raw = _attach(names[0], np.int16, length)
+    shm_out, data_decoded = _attach(names[1], dtype, length)
+    shm_codes, codes_decoded = _attach(names[2], np.uint8, length)
+    try:
+        # 每个样点对应3个码元，信道按绝对位置生成
+        offset = 3*start if mode == 'baseband' else 3*fc_ratio*N*start
+        sent = []
+        received = []
+
+        stream = (data_raw[i:min(i+chunk, end)] for i in range(start, end, chunk))
+        stream = pipeline.tap(pipeline.pcm_encode_stage(stream, data_max), sent)
+        stream = pipeline.correction_encode_stage(stream)
+        stream = pipeline.modulate_stage(stream, fc_ratio*fs, fs, N, mode, mapping, dtype)
+        stream = pipeline.channel_stage(stream, model, offset)
+        stream = pipeline.demodulate_stage(stream, fc_ratio*fs, fs, N, method, mode, mapping)
+        stream = pipeline.tap(pipeline.correction_decode_stage(stream), received)
+        stream = pipeline.pcm_decode_stage(stream, data_max, dtype)
+
+        position = start
+        for data in stream:
+            data_decoded[position:position+len(data)] = data
+            position += len(data)
+
+        codes_sent = np.concatenate([s.data for s in sent]) if sent else np.zeros(0, np.uint8)
+        codes_received = np.concatenate([r.data[:r.length//8] for r in received])
+        codes_decoded[start:end] = codes_received
+        return int(np.count_nonzero(codes_sent != codes_received))
+    finally:
+        del data_raw, data_decoded, codes_decoded
+        shm_in.close()
+        shm_out.close()
+        shm_codes.close()
+
+
+def parallel_link(data_raw, fs, fc_ratio=10, N=10, amp=0.3, method='correlated',
+                  workers=None, shard=DEFAULT_SHARD, chunk=pipeline.DEFAULT_CHUNK, seed=None,
+                  mode='passband', channel_model=None, mapping='natural', dtype=np.float64):
+    """
+    Transmit a signal through the whole link on several processes
+
+    The signal is split into shards of `shard` samples, every sample is one
+    PCM codeword, one (12,8) codeword and three 16PSK symbols, so shard
+    boundaries never cut a codeword or a symbol. Each shard runs the
+    streaming pipeline in a worker process on shared memory buffers and
+    writes its result in place. The channel is drawn by absolute position
+    from `seed` (see `channel.NoiseStream`), so the result depends on
+    `seed` only, not on `shard`, `chunk`, the number of workers or on
+    scheduling, and with correlation demodulation equals the one of
+    `pipeline.stream_link`.
+
+    Parameters
+    -----------
+    data_raw: ndarray(n), int16
+        signal to transmit
+
+    fs: int
+        sampling rate of the signal, used as the symbol rate
+
+    fc_ratio: int
+        carrier frequency in multiples of the symbol rate
+
+    N: int
+        data per analog period
+
+    amp: float
+        noise gain of the channel
+
+    method: str
+        'correlated' or 'coherent' demodulation, the coherent filter
+        restarts at every shard
+
+    workers: int
+        number of worker processes, all cores if not given
+
+    shard: int
+        number of samples per shard
+
+    chunk: int
+        number of samples per block inside a shard
+
+    seed: int or None
+        seed of the channel noise
+
+    mode: str
+        'passband' or 'baseband' simulation of the modem and channel
+
+    channel_model: channel.ChannelModel, optional
+        channel to use instead of AWGN of standard deviation `amp`
+
+    mapping: str or sequence of int
+        16PSK symbol mapping, see `psk16.mapping_tables`
+
+    dtype: numpy dtype
+        precision of the computation and of the decoded signal, float64 or
+        float32, see `pipeline.stream_link`
+
+    Returns
+    -----------
+    data_decoded: ndarray(n)
+        decoded signal
+
+    codes_decoded: ndarray(n), uint8
+        received PCM codewords
+
+    errors: int
+        number of PCM codewords received in error
+    """
+    data_raw = np.asarray(data_raw, dtype=np.int16)
+    length = len(data_raw)
+    data_max = np.max(np.abs(data_raw))
+    workers = workers or os.cpu_count()
+    dtype = psk16.float_dtype(dtype)
+
+    blocks = [shared_memory.SharedMemory(create=True, size=max(1, length*np.dtype(block_dtype).itemsize))
+              for block_dtype in (np.int16, dtype, np.uint8)]
+    try:
+        np.ndarray((length,), dtype=np.int16, buffer=blocks[0].buf)[:] = data_raw
+        names = [block.name for block in blocks]
+
+        bounds = list(range(0, length, shard))
+        if channel_model is None:
+            channel_model = channel.AWGNChannel(amp, N, fc_ratio, seed)
+        tasks = [(names, length, start, min(start+shard, length), data_max, fs,
+                  fc_ratio, N, channel_model, method, mode, chunk, backend.get_backend(), mapping,
+                  dtype)
+                 for start in bounds]
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            errors = sum(executor.map(_run_shard, tasks))
+
+        data_decoded = np.ndarray((length,), dtype=dtype, buffer=blocks[1].buf).copy()
+        codes_decoded = np.ndarray((length,), dtype=np.uint8, buffer=blocks[2].buf).copy()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return data_decoded, codes_decoded, errors
+
+
+if __name__ == "__main__":
+    import module.audio_func as audio_func
+
+    fs, data_raw = audio_func.audioread('audio.wav', mmap=True)
+    data_decoded, codes_decoded, errors = parallel_link(data_raw, fs, seed=0)
+    audio_func.audiowrite(data_decoded, fs, 'audio_correlated_decoded_parallel.wav')
+    print(errors, errors/len(data_raw))
@@ -1,7 +1,15 @@
+import functools
+
 import numpy as np
 
+from module.bitstream import Bitstream
+
+# A律13折线各段落的起始电平与段内量化间隔
+SEG_START = np.array([0, 32, 64, 128, 256, 512, 1024, 2048])
+SEG_STEP = np.array([2, 2, 4, 8, 16, 32, 64, 128])
 
-def PCM_encode(in_data,vp=0):
+
+def PCM_encode(in_data,vp=0,packed=False):
     '''
     Apply A-law PCM encoding to the input signal
     
@@ -13,15 +21,23 @@ def PCM_encode(in_data,vp=0):
     vp: float
         maximum amplitute of the input signal
 
+    packed: bool
+        return the codewords as a Bitstream instead of a float bit array
+
     Returns
     -----------
-    out_data: ndarray(n*8)
+    out_data: ndarray(n*8) or Bitstream
         A-law PCM encoded signal
     
     Author
     ----------
     By SCUT Zening Lin, on 2021-01-06
     '''
+    if packed:
+        # 每个样点的码字恰为一个字节，直接作为压缩比特流
+        out_data, data_max = PCM_encode_fast(in_data, vp)
+        return Bitstream(out_data), data_max
+
     if vp==0:
         data_max = np.max(np.abs(in_data))
     else:
@@ -98,7 +114,7 @@ def PCM_decode(in_data, v):
     
     Parameters
     -----------
-    in_data: ndarray(n) 
+    in_data: ndarray(n) or Bitstream
         A-law encoded signal
      
     v: int
@@ -115,6 +131,9 @@ def PCM_decode(in_data, v):
     
     Based on the project `python_sound_open` by Jie Y.
     '''
+    if isinstance(in_data, Bitstream):
+        return PCM_decode_fast(in_data, v)
+
     length = len(in_data)//8
     in_data = in_data.reshape(length, 8)
     slot = np.array([0, 32, 64, 128, 256, 512, 1024, 2048])
@@ -131,6 +150,102 @@ def PCM_decode(in_data, v):
         # out_data[i] = out_data[i]*(v-s)+s
     return out_data
 
+@functools.lru_cache(maxsize=None)
+def _encode_table():
+    """
+    Build the 4096-entry table mapping a quantized magnitude to the 7-bit
+    segment/step code (bits 1-7 of the A-law codeword)
+    """
+    mag = np.arange(4096)
+    seg = np.searchsorted(SEG_START, mag, side='right') - 1
+    seg_index = (mag - SEG_START[seg]) // SEG_STEP[seg]
+    table = ((seg << 4) | seg_index).astype(np.uint8)
+    table.flags.writeable = False
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def _decode_table(dtype=np.float64):
+    """
+    Build the 256-entry table mapping an A-law codeword to its normalized
+    reconstruction level (before scaling by the maximum voltage)
+    """
+    code = np.arange(256)
+    sgn = 2 * (code >> 7) - 1
+    seg = (code >> 4) & 7
+    dt = (code & 15) * SEG_STEP[seg]
+    table = (sgn * (SEG_START[seg] + dt + 0.5 * SEG_STEP[seg]) / 4096).astype(dtype)
+    table.flags.writeable = False
+    return table
+
+
+def PCM_encode_fast(in_data, vp=0):
+    '''
+    Apply A-law PCM encoding to the input signal, table driven
+
+    Bit-exact with `PCM_encode`, but each sample is encoded as one packed
+    uint8 codeword (polarity bit as MSB), `np.unpackbits` of the result
+    gives the bit stream returned by `PCM_encode`.
+
+    Parameters
+    -----------
+    in_data: ndarray(n)
+        input signal
+
+    vp: float
+        maximum amplitute of the input signal
+
+    Returns
+    -----------
+    out_data: ndarray(n), uint8
+        A-law PCM codewords
+
+    data_max: float
+        maximum amplitute used for normalization
+    '''
+    if vp==0:
+        data_max = np.max(np.abs(in_data))
+    else:
+        data_max = vp
+
+    in_data = in_data/data_max*4096
+
+    # 超出量化范围的幅值落在最后一段的最高电平
+    mag = np.minimum(np.abs(in_data), 4095).astype(np.intp)
+    out_data = _encode_table()[mag]
+    # 极性码
+    out_data |= (in_data > 0).view(np.uint8) << 7
+
+    return out_data, data_max
+
+
+def PCM_decode_fast(in_data, v, dtype=np.float64):
+    '''
+    Apply A-law PCM decoding to packed codewords, table driven
+
+    Parameters
+    -----------
+    in_data: ndarray(n), uint8 or Bitstream
+        A-law codewords, as returned by `PCM_encode_fast`
+
+    v: int
+        maximum voltage of the decoded signal
+
+    dtype: numpy dtype
+        dtype of the decoded signal, float32 halves its size
+
+    Returns
+    -----------
+    out_data: ndarray(n)
+        A-law decoded signal, identical to `PCM_decode` on the unpacked bits
+        in float64
+    '''
+    if isinstance(in_data, Bitstream):
+        in_data = in_data.data[:in_data.length//8]
+    out_data = _decode_table(np.dtype(dtype))[in_data]
+    out_data *= out_data.dtype.type(v)
+    return out_data
+
 if __name__ == "__main__":
     # 测试数据： -2V,2V,-0.74V,0V
     data_raw = np.array([169646,1352,321,-0.74,1,0,-2])
@@ -138,4 +253,8 @@ if __name__ == "__main__":
     data_encoded,m = PCM_encode(data_raw)
     data_decoded = PCM_decode(data_encoded,m)
 
-    print(data_raw,'\n',data_encoded,'\n',data_decoded)
\ No newline at end of file
+    print(data_raw,'\n',data_encoded,'\n',data_decoded)
+
+    codes,m = PCM_encode_fast(data_raw)
+    print(np.array_equal(np.unpackbits(codes), data_encoded),
+          np.array_equal(PCM_decode_fast(codes,m), data_decoded))
\ No newline at end of file
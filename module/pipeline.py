@@ -0,0 +1,326 @@
+import collections
+
+import numpy as np
+
+import module.audio_func as audio_func
+import module.backend as backend
+import module.psk16 as psk16
+import module.channel as channel
+import module.profiling as profiling
+from module.bitstream import Bitstream
+
+# 每块读取的样点数，16PSK调制后每个样点对应 3*ratio*N 个模拟样点
+DEFAULT_CHUNK = 4096
+
+
+@profiling.profiled_stream('read_wav', source=True)
+def read_wav_chunks(path, chunk=DEFAULT_CHUNK):
+    """
+    Read a mono 16-bit wav file block by block
+
+    The file is memory mapped, each block is a view of the mapping and no
+    sample is copied until a stage reads it.
+
+    Parameters
+    -----------
+    path: str
+        wav file path
+
+    chunk: int
+        number of samples per block
+
+    Yields
+    -----------
+    data: ndarray(chunk), int16
+        next block of samples, the last block may be shorter
+    """
+    fs, data = audio_func.audioread(path, mmap=True)
+    if data.ndim != 1 or data.dtype != np.int16:
+        raise ValueError('%s is not a mono 16-bit wav file' % path)
+    for i in range(0, len(data), chunk):
+        yield data[i:i+chunk]
+
+
+def wav_peak(path, chunk=DEFAULT_CHUNK):
+    """
+    Maximum amplitude of a wav file, read block by block
+
+    Returns the same value as `np.max(np.abs(data))` on the whole file, the
+    normalization `PCM_encode` applies by default.
+    """
+    data_max = None
+    for data in read_wav_chunks(path, chunk):
+        peak = np.max(np.abs(data))
+        if data_max is None or peak > data_max:
+            data_max = peak
+    if data_max is None:
+        raise ValueError('%s contains no samples' % path)
+    return data_max
+
+
+@profiling.profiled_stream('pcm_encode')
+def pcm_encode_stage(chunks, vp):
+    """
+    A-law encode each block with the global maximum amplitude `vp`
+    """
+    for data in chunks:
+        yield backend.kernel('pcm_encode')(data, vp)[0]
+
+
+@profiling.profiled_stream('correction_encode')
+def correction_encode_stage(streams):
+    for stream in streams:
+        yield backend.kernel('correction_en')(stream)
+
+
+@profiling.profiled_stream('interleave')
+def interleave_stage(streams, interleaver, align=12):
+    """
+    Pass the bit blocks through an interleaver or deinterleaver (see
+    `interleaver.py`), regrouped so that every yielded block holds a
+    multiple of `align` bits (whole (12,8) codewords and 16PSK symbols)
+    """
+    interleaver.reset()
+    pending = np.zeros(0, dtype=np.uint8)
+    for stream in streams:
+        pending = np.concatenate([pending, interleaver.process(stream.to_bits())])
+        length = len(pending) - len(pending) % align
+        if length:
+            yield Bitstream.from_bits(pending[:length])
+            pending = pending[length:]
+    pending = np.concatenate([pending, interleaver.flush()])
+    if len(pending):
+        yield Bitstream.from_bits(pending)
+
+
+@profiling.profiled_stream('modulate')
+def modulate_stage(streams, fc, fs, N, mode='passband', mapping='natural', dtype=np.float64):
+    """
+    16PSK modulate each block, into the sampled passband waveform or, with
+    `mode='baseband'`, into one complex sample per symbol, of precision
+    `dtype` (see `psk16.DTYPES`)
+
+    The bits are relabelled by `psk16.map_symbols` before the (natural
+    binary) modulation kernel, so every backend supports every mapping.
+    """
+    for stream in streams:
+        stream = psk16.map_symbols(stream, mapping)
+        if mode == 'baseband':
+            yield psk16.psk16_baseband_modulate(stream, fc, fs, N, dtype=dtype)
+        else:
+            yield backend.kernel('psk16_modulate')(stream, fc, fs, N, dtype)
+
+
+@profiling.profiled_stream('channel')
+def channel_stage(signals, model, start=0):
+    """
+    Pass each block through the channel model `model` (a
+    `channel.ChannelModel`), `start` being the absolute position of the
+    first block in samples, or in symbols for baseband blocks, so the
+    channel does not depend on how the signal is cut into blocks
+
+    The blocks are freshly modulated, the channel is applied in place.
+    """
+    position = start
+    for signal in signals:
+        length = len(signal)
+        yield model(signal, position, inplace=True)
+        position += length
+
+
+@profiling.profiled_stream('demodulate')
+def demodulate_stage(signals, fc, fs, N, method='correlated', mode='passband', mapping='natural'):
+    """
+    Demodulate each block into packed bits, demapped with
+    `psk16.demap_symbols`
+
+    Blocks are demodulated in their own precision, float32 blocks are not
+    converted. Baseband blocks are decided with the correlation demodulator
+    rule.
+
+    The coherent demodulator keeps its filter state across blocks and
+    decides a symbol only once its whole delayed integration window has
+    been filtered, decided symbols are regrouped so that every yielded
+    block holds whole (12,8) codewords (3 symbols).
+    """
+    for stream in _decide_stage(signals, fc, fs, N, method, mode):
+        yield psk16.demap_symbols(stream, mapping)
+
+
+def _decide_stage(signals, fc, fs, N, method, mode):
+    if mode == 'baseband':
+        if method != 'correlated':
+            raise ValueError('baseband mode only models correlated demodulation')
+        for signal in signals:
+            yield psk16.psk16_baseband_demodulate(signal, packed=True)
+    elif method == 'correlated':
+        for signal in signals:
+            yield backend.kernel('psk16_correlated_demodulate')(signal, fc, fs, N)
+    elif method == 'coherent':
+        demodulator = None
+        pending = np.zeros(0, dtype=np.uint8)
+        for signal in signals:
+            if demodulator is None:
+                demodulator = psk16.CoherentDemodulator(fc, fs, N, signal.dtype)
+            pending = np.concatenate([pending, demodulator.process(signal)])
+            length = len(pending) - len(pending) % 3
+            yield psk16.symbol_bits(pending[:length], packed=True)
+            pending = pending[length:]
+        if demodulator is not None:
+            pending = np.concatenate([pending, demodulator.flush()])
+        yield psk16.symbol_bits(pending, packed=True)
+    else:
+        raise ValueError('unknown demodulation method %r' % method)
+
+
+@profiling.profiled_stream('correction_decode')
+def correction_decode_stage(streams):
+    for stream in streams:
+        yield backend.kernel('correction_de')(stream)
+
+
+@profiling.profiled_stream('pcm_decode')
+def pcm_decode_stage(streams, v, dtype=np.float64):
+    for stream in streams:
+        yield backend.kernel('pcm_decode')(stream, v, dtype)
+
+
+def tap(streams, queue):
+    """
+    Pass the blocks through unchanged, appending a reference to each one to
+    `queue` so another part of the pipeline can consume them later
+    """
+    for stream in streams:
+        queue.append(stream)
+        yield stream
+
+
+def write_wav_chunks(chunks, fs, path, length):
+    """
+    Write blocks of samples to a memory mapped mono 16-bit wav file of
+    `length` samples as they arrive
+
+    Samples are converted to int16 as `audio_func.audiowrite` does.
+
+    Returns
+    -----------
+    length: int
+        number of samples written
+    """
+    out_data = audio_func.audiowrite_mmap(path, fs, length)
+    position = 0
+    for data in chunks:
+        out_data[position:position+len(data)] = data
+        position += len(data)
+    if isinstance(out_data, np.memmap):
+        out_data.flush()
+    del out_data
+    return position
+
+
+def stream_link(in_path, out_path, fc_ratio=10, N=10, amp=0.3,
+                method='correlated', chunk=DEFAULT_CHUNK, mode='passband',
+                seed=None, channel_model=None, interleaver=None, mapping='natural',
+                dtype=np.float64):
+    """
+    Transmit a wav file through the whole link block by block
+
+    PCM -> (12,8) coding -> 16PSK -> AWGN -> demodulation -> decoding ->
+    PCM decoding, the decoded signal is written to `out_path` as it is
+    produced, so the peak memory only depends on `chunk`.
+
+    Parameters
+    -----------
+    in_path: str
+        mono 16-bit wav file to transmit
+
+    out_path: str
+        wav file receiving the decoded signal
+
+    fc_ratio: int
+        carrier frequency in multiples of the symbol rate
+
+    N: int
+        data per analog period
+
+    amp: float
+        noise gain of the channel
+
+    method: str
+        'correlated' or 'coherent' demodulation
+
+    chunk: int
+        number of samples per block
+
+    mode: str
+        'passband' to synthesize the modulated waveform, 'baseband' to
+        simulate one complex sample per symbol (correlated only)
+
+    seed: int or None
+        seed of the channel noise
+
+    channel_model: channel.ChannelModel, optional
+        channel to use instead of AWGN of standard deviation `amp`
+
+    interleaver: interleaver.BlockInterleaver or ConvolutionalInterleaver, optional
+        bit interleaver between the (12,8) coder and the modulator,
+        inverted after demodulation
+
+    mapping: str or sequence of int
+        16PSK symbol mapping, see `psk16.mapping_tables`
+
+    dtype: numpy dtype
+        precision of the waveform, the channel noise, the demodulation and
+        the decoded signal, float64 or float32 (half the memory traffic)
+
+    Returns
+    -----------
+    result: dict
+        number of samples and of PCM codewords received in error
+    """
+    dtype = psk16.float_dtype(dtype)
+    fs, data = audio_func.audioread(in_path, mmap=True)
+    length = len(data)
+    del data
+    data_max = wav_peak(in_path, chunk)
+
+    sent = collections.deque()
+    stream = read_wav_chunks(in_path, chunk)
+    stream = tap(pcm_encode_stage(stream, data_max), sent)
+    stream = correction_encode_stage(stream)
+    if interleaver is not None:
+        if interleaver.overhead % 12:
+            raise ValueError('interleaver overhead must be a multiple of 12 bits')
+        stream = interleave_stage(stream, interleaver)
+    stream = modulate_stage(stream, fc_ratio*fs, fs, N, mode, mapping, dtype)
+    if channel_model is None:
+        channel_model = channel.AWGNChannel(amp, N, fc_ratio, seed)
+    stream = channel_stage(stream, channel_model)
+    stream = demodulate_stage(stream, fc_ratio*fs, fs, N, method, mode, mapping)
+    if interleaver is not None:
+        stream = interleave_stage(stream, interleaver.inverted())
+    stream = correction_decode_stage(stream)
+
+    errors = [0]
+
+    def compare(streams):
+        # 与发送端码字逐块比较，统计误码字数
+        buffered = np.zeros(0, dtype=np.uint8)
+        for received in streams:
+            while len(buffered) < len(received)//8 and sent:
+                buffered = np.concatenate([buffered, sent.popleft().data])
+            count = received.length//8
+            errors[0] += int(np.count_nonzero(buffered[:count] != received.data[:count]))
+            buffered = buffered[count:]
+            yield received
+
+    stream = pcm_decode_stage(compare(stream), data_max, dtype)
+    length = write_wav_chunks(stream, fs, out_path, length)
+
+    return {'samples': length, 'errors': errors[0],
+            'error_rate': errors[0]/length if length else 0.0}
+
+
+if __name__ == "__main__":
+    result = stream_link('audio.wav', 'audio_correlated_decoded_stream.wav')
+    print(result)
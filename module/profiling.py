@@ -0,0 +1,366 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from module.bitstream import Bitstream
+
+# 是否记录，关闭时各钩子只做一次布尔判断
+_enabled = False
+# 是否用tracemalloc统计内存分配峰值(开销较大)
+_memory = False
+_lock = threading.Lock()
+_stats = {}
+_events = []
+_origin = time.perf_counter()
+
+
+class StageStats:
+    """
+    Accumulated measurements of one stage
+
+    Attributes
+    -----------
+    calls: int
+        number of calls (blocks for stream stages)
+
+    wall, cpu: float
+        wall clock and CPU time spent in the stage itself, in seconds
+
+    bytes_in, bytes_out: int
+        size of the data received and produced
+
+    items_in, items_out: int
+        number of samples (ndarray) or bits (Bitstream) received and
+        produced
+
+    peak_alloc: int
+        largest allocation peak of one call in bytes, with memory tracing
+    """
+    __slots__ = ('name', 'calls', 'wall', 'cpu', 'bytes_in', 'bytes_out',
+                 'items_in', 'items_out', 'peak_alloc')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.items_in = 0
+        self.items_out = 0
+        self.peak_alloc = 0
+
+    def as_dict(self):
+        record = {slot: getattr(self, slot) for slot in self.__slots__}
+        record['items_per_s'] = self.items_in/self.wall if self.wall else 0.0
+        record['bytes_per_s'] = self.bytes_in/self.wall if self.wall else 0.0
+        return record
+
+
+def enable(memory=False):
+    """
+    Start recording, with `memory` the allocation peaks are traced with
+    tracemalloc, which slows the stages down
+    """
+    global _enabled, _memory
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+def disable():
+    """
+    Stop recording, the measurements are kept until `reset`
+    """
+    global _enabled, _memory
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _enabled = False
+    _memory = False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Drop the recorded measurements and trace events
+    """
+    global _origin
+    with _lock:
+        _stats.clear()
+        del _events[:]
+        _origin = time.perf_counter()
+
+
+def _size(data):
+    """
+    Size in bytes and number of items of a stage input or output
+    """
+    if isinstance(data, Bitstream):
+        return data.nbytes, data.length
+    if isinstance(data, np.ndarray):
+        return data.nbytes, data.size
+    if isinstance(data, tuple) and data:
+        return _size(data[0])
+    if isinstance(data, list):
+        sizes = [_size(block) for block in data]
+        return sum(size[0] for size in sizes), sum(size[1] for size in sizes)
+    return 0, 0
+
+
+def _record(name, wall, cpu, peak, start, data_in=None, data_out=None):
+    bytes_in, items_in = _size(data_in)
+    bytes_out, items_out = _size(data_out)
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = StageStats(name)
+        stats.calls += 1
+        stats.wall += wall
+        stats.cpu += cpu
+        stats.bytes_in += bytes_in
+        stats.bytes_out += bytes_out
+        stats.items_in += items_in
+        stats.items_out += items_out
+        stats.peak_alloc = max(stats.peak_alloc, peak)
+        if start is not None:
+            _events.append({'name': name, 'ph': 'X', 'pid': os.getpid(),
+                            'tid': threading.get_ident(),
+                            'ts': (start - _origin)*1e6, 'dur': wall*1e6,
+                            'args': {'bytes_in': bytes_in, 'bytes_out': bytes_out}})
+
+
+class _Clock:
+    """
+    Wall, CPU and allocation measurement of one code segment
+    """
+    __slots__ = ('start', 'cpu', 'memory')
+
+    def __init__(self):
+        if _memory:
+            tracemalloc.reset_peak()
+            self.memory = tracemalloc.get_traced_memory()[0]
+        else:
+            self.memory = None
+        self.cpu = time.thread_time()
+        self.start = time.perf_counter()
+
+    def stop(self):
+        wall = time.perf_counter() - self.start
+        cpu = time.thread_time() - self.cpu
+        peak = tracemalloc.get_traced_memory()[1] - self.memory if self.memory is not None else 0
+        return wall, cpu, peak
+
+
+class _Span:
+    """
+    Measurement of one `stage` block, `output` records what it produced
+    """
+    __slots__ = ('name', 'data_in', 'data_out', 'clock')
+
+    def __init__(self, name, data_in):
+        self.name = name
+        self.data_in = data_in
+        self.data_out = None
+
+    def output(self, data_out):
+        self.data_out = data_out
+
+    def __enter__(self):
+        self.clock = _Clock()
+        return self
+
+    def __exit__(self, *exc):
+        wall, cpu, peak = self.clock.stop()
+        _record(self.name, wall, cpu, peak, self.clock.start, self.data_in, self.data_out)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def output(self, data_out):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def stage(name, data_in=None):
+    """
+    Context manager measuring the enclosed code as the stage `name`
+
+    Pass the input as `data_in` and the output to `span.output` to record
+    the bytes and items in and out:
+
+        with profiling.stage('PCM_encode', data_raw) as span:
+            stream, m = pcm.PCM_encode(data_raw, packed=True)
+            span.output(stream)
+    """
+    if not _enabled:
+        return _null_span
+    return _Span(name, data_in)
+
+
+def profiled(name=None):
+    """
+    Decorator measuring every call of a function as the stage `name` (the
+    function name by default), the first argument is taken as the input
+    and the return value as the output
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            clock = _Clock()
+            out_data = func(*args, **kwargs)
+            wall, cpu, peak = clock.stop()
+            _record(stage_name, wall, cpu, peak, clock.start, args[0] if args else None, out_data)
+            return out_data
+        return wrapper
+    return decorator
+
+
+class _Upstream:
+    """
+    Iterator over the input of a stream stage that closes the measurement
+    segment of the stage while the upstream stages run
+    """
+    __slots__ = ('iterator', 'owner')
+
+    def __init__(self, iterable, owner):
+        self.iterator = iter(iterable)
+        self.owner = owner
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.owner.pause()
+        try:
+            data = next(self.iterator)
+        finally:
+            self.owner.resume()
+        self.owner.data_in.append(data)
+        return data
+
+
+class _StreamStage:
+    """
+    Measurement of a generator stage: only the time between pulling its
+    input and yielding its output counts, the upstream stages are measured
+    by their own hooks
+    """
+    __slots__ = ('name', 'clock', 'wall', 'cpu', 'peak', 'data_in')
+
+    def __init__(self, name):
+        self.name = name
+        self.clock = None
+        self.wall = self.cpu = 0.0
+        self.peak = 0
+        self.data_in = []
+
+    def resume(self):
+        self.clock = _Clock()
+
+    def pause(self):
+        wall, cpu, peak = self.clock.stop()
+        self.wall += wall
+        self.cpu += cpu
+        self.peak = max(self.peak, peak)
+
+    def run(self, func, streams, args, kwargs):
+        upstream = _Upstream(streams, self) if streams is not None else None
+        generator = func(upstream, *args, **kwargs) if upstream is not None else func(*args, **kwargs)
+        while True:
+            start = time.perf_counter()
+            self.resume()
+            try:
+                data = next(generator)
+            except StopIteration:
+                self.pause()
+                return
+            self.pause()
+            _record(self.name, self.wall, self.cpu, self.peak, None, self.data_in, data)
+            # 火焰图中一个事件覆盖整个取块过程，上游阶段的事件嵌套在其中
+            with _lock:
+                _events.append({'name': self.name, 'ph': 'X', 'pid': os.getpid(),
+                                'tid': threading.get_ident(), 'ts': (start - _origin)*1e6,
+                                'dur': (time.perf_counter() - start)*1e6,
+                                'args': {'self_us': self.wall*1e6}})
+            self.wall = self.cpu = 0.0
+            self.peak = 0
+            self.data_in = []
+            yield data
+
+
+def profiled_stream(name=None, source=False):
+    """
+    Decorator measuring a generator stage of the pipeline as the stage
+    `name`, the first argument being the iterable of input blocks
+
+    Each yielded block is one call, its time excludes the time spent in
+    the upstream stages. With `source` the stage has no input iterable.
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            if source:
+                return _StreamStage(stage_name).run(func, None, args, kwargs)
+            return _StreamStage(stage_name).run(func, args[0], args[1:], kwargs)
+        return wrapper
+    return decorator
+
+
+def summary():
+    """
+    Measurements of every stage, in the order they were first seen
+
+    Returns
+    -----------
+    stages: dict
+        stage name -> calls, wall and CPU time, bytes and items in and
+        out, items/s, bytes/s and peak allocation
+    """
+    with _lock:
+        return {name: stats.as_dict() for name, stats in _stats.items()}
+
+
+def write_json(path):
+    """
+    Write the `summary` to a JSON file
+    """
+    with open(path, 'w') as f:
+        json.dump(summary(), f, indent=2)
+
+
+def write_chrome_trace(path):
+    """
+    Write the recorded calls as a Chrome trace (chrome://tracing, Perfetto
+    or speedscope), every call being a complete event
+    """
+    with _lock:
+        events = list(_events)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
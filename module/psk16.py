@@ -1,8 +1,217 @@
 import numpy as np
-import scipy
-import scipy.signal
+import functools
 import math
 
+from module.bitstream import Bitstream, as_bits
+
+# 16PSK星座图，各点的同相与正交分量
+PHASETAB = np.array(
+    [[0.9807852804032304,0.19509032201612825],
+    [0.8314696123025452,0.5555702330196022],
+    [0.5555702330196023,0.8314696123025452],
+    [0.19509032201612833,0.9807852804032304],
+    [-0.1950903220161282,0.9807852804032304],
+    [-0.555570233019602,0.8314696123025453],
+    [-0.8314696123025453,0.5555702330196022],
+    [-0.9807852804032304,0.1950903220161286],
+    [-0.9807852804032304,-0.19509032201612836],
+    [-0.8314696123025455,-0.555570233019602],
+    [-0.5555702330196022,-0.8314696123025452],
+    [-0.19509032201612866,-0.9807852804032303],
+    [0.1950903220161283,-0.9807852804032304],
+    [0.5555702330196026,-0.831469612302545],
+    [0.8314696123025452,-0.5555702330196022],
+    [0.9807852804032303,-0.19509032201612872]]
+)
+PHASETAB.flags.writeable = False
+
+# 16PSK星座图角度表，各判决区间的中心角度
+ANGLETAB = np.array([math.pi*i/8+math.pi/16 for i in range(16)])
+ANGLETAB.flags.writeable = False
+
+# 角度值的十进制转换为二进制编码输出
+DEC2BIN = np.unpackbits(np.arange(16, dtype=np.uint8)[:,np.newaxis], axis=1)[:,4:].astype(np.int64)
+DEC2BIN.flags.writeable = False
+
+# 内置的符号映射
+MAPPINGS = ('natural', 'gray')
+
+# 可选的计算精度，float32使调制波形与相关运算的内存流量减半
+DTYPES = ('float64', 'float32')
+
+
+def float_dtype(dtype=np.float64):
+    """
+    Real dtype of a computation mode, float64 (default) or float32
+
+    Raises
+    -----------
+    ValueError
+        for any other dtype
+    """
+    dtype = np.dtype(dtype)
+    if dtype.name not in DTYPES:
+        raise ValueError('unsupported dtype %r, use one of %s' % (dtype.name, ', '.join(DTYPES)))
+    return dtype
+
+
+@functools.lru_cache(maxsize=None)
+def _carrier(N):
+    """
+    Local carrier of one analog period, columns are cos and -sin
+
+    The table is computed once per N and shared, it is read-only.
+    """
+    carrier=np.zeros((N,2))
+    for i in range(N):
+        carrier[i] = [math.cos(2*math.pi/(N-1)*i),-math.sin(2*math.pi/(N-1)*i)]
+    carrier.flags.writeable = False
+    return carrier
+
+
+@functools.lru_cache(maxsize=64)
+def _carrier_tiled(N,ratio,dtype=np.float64):
+    """
+    Local carrier repeated over the `ratio` analog periods of a symbol, the
+    correlator matrix of the vectorized demodulators, read-only
+    """
+    carrier_n = np.tile(_carrier(N), (ratio,1)).astype(dtype)
+    carrier_n.flags.writeable = False
+    return carrier_n
+
+
+def _mapping_key(mapping):
+    """
+    Hashable form of a mapping: its name or the tuple of its 16 labels
+    """
+    if isinstance(mapping, str):
+        if mapping not in MAPPINGS:
+            raise ValueError('unknown symbol mapping %r' % mapping)
+        return mapping
+    return tuple(int(label) for label in mapping)
+
+
+@functools.lru_cache(maxsize=None)
+def _mapping_tables(mapping):
+    if mapping == 'natural':
+        labels = np.arange(16)
+    elif mapping == 'gray':
+        labels = np.arange(16) ^ (np.arange(16) >> 1)
+    else:
+        labels = np.array(mapping)
+        if labels.shape != (16,) or not np.array_equal(np.sort(labels), np.arange(16)):
+            raise ValueError('a symbol mapping must be a permutation of 0..15')
+    to_point = np.argsort(labels).astype(np.intp)
+    to_bits = labels.astype(np.intp)
+    to_point.flags.writeable = False
+    to_bits.flags.writeable = False
+    return to_point, to_bits
+
+
+def mapping_tables(mapping='natural'):
+    """
+    Lookup tables of a 16PSK symbol mapping
+
+    Point k of `PHASETAB` carries the 4-bit value labels[k]. 'natural' is
+    labels[k] = k, 'gray' is labels[k] = k^(k>>1) so neighbouring points
+    differ in one bit, a custom mapping is given as the sequence of its 16
+    labels.
+
+    Parameters
+    -----------
+    mapping: str or sequence of int
+        'natural', 'gray' or the labels of the 16 points
+
+    Returns
+    -----------
+    to_point: ndarray(16)
+        constellation point of each 4-bit value, used by the mapper
+
+    to_bits: ndarray(16)
+        4-bit value of each constellation point, used by the demapper
+    """
+    return _mapping_tables(_mapping_key(mapping))
+
+
+@functools.lru_cache(maxsize=None)
+def _byte_mapping_table(mapping, inverse):
+    """
+    Relabel the two symbols packed in a byte in one lookup
+    """
+    table = _mapping_tables(mapping)[1 if inverse else 0]
+    values = np.arange(256)
+    byte_table = ((table[values >> 4] << 4) | table[values & 15]).astype(np.uint8)
+    byte_table.flags.writeable = False
+    return byte_table
+
+
+def _relabel(in_data, mapping, inverse):
+    mapping = _mapping_key(mapping)
+    if mapping == 'natural':
+        return in_data
+    stream = in_data if isinstance(in_data, Bitstream) else Bitstream.from_bits(np.asarray(in_data, dtype=np.uint8))
+    length = stream.length - stream.length % 4
+    data = np.take(_byte_mapping_table(mapping, inverse), stream.data[:(length+7)//8])
+    if length % 8:
+        # 末尾的填充半字节保持为0
+        data[-1] &= 0xf0
+    out_data = Bitstream(data, length)
+    if isinstance(in_data, Bitstream):
+        return out_data
+    return out_data.to_bits()
+
+
+def map_symbols(in_data, mapping='natural'):
+    """
+    Replace every 4-bit value by the natural binary index of its
+    constellation point, so that a natural binary modulator transmits the
+    `mapping` of the input; one gather over the packed bytes
+
+    Parameters
+    -----------
+    in_data: ndarray(n) or Bitstream
+        bits to transmit
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    Returns
+    -----------
+    out_data: ndarray(n) or Bitstream
+        bits of the constellation point indices, packed if the input is
+    """
+    return _relabel(in_data, mapping, False)
+
+
+def demap_symbols(in_data, mapping='natural'):
+    """
+    Invert `map_symbols` on the decisions of a natural binary demodulator
+    """
+    return _relabel(in_data, mapping, True)
+
+
+def _symbols(in_data,mapping='natural'):
+    """
+    Group the bits of the input signal by 4 into symbol indices (uint8),
+    the constellation points of the `mapping`
+    """
+    if isinstance(in_data, Bitstream):
+        # 每个字节的高、低半字节即两个码元，不必展开为比特
+        length = in_data.length//4
+        data = in_data.data[:(length+1)//2]
+        symbols = np.empty(2*len(data), dtype=np.uint8)
+        np.right_shift(data, 4, out=symbols[0::2])
+        np.bitwise_and(data, 15, out=symbols[1::2])
+        symbols = symbols[:length]
+    else:
+        bits = np.asarray(in_data)
+        length = len(bits)//4
+        bits = bits[:length*4].reshape(length,4) != 0
+        symbols = np.packbits(bits, axis=1)[:,0] >> 4
+    if _mapping_key(mapping) != 'natural':
+        symbols = mapping_tables(mapping)[0][symbols]
+    return symbols
+
 
 def psk16_modulate(in_data,fc,fs,N):
     """
@@ -10,7 +219,7 @@ def psk16_modulate(in_data,fc,fs,N):
 
     Parameters
     -----------
-    in_data: ndarray(n) 
+    in_data: ndarray(n) or Bitstream
         A-law encoded signal
      
     fc: int
@@ -31,6 +240,7 @@ def psk16_modulate(in_data,fc,fs,N):
     ----------
     By SCUT Zening Lin, Yushu Li, Qiheng Tan, Qingfeng Wang on 2020-01-06
     """
+    in_data = as_bits(in_data)
     length = len(in_data)//4
     in_data = in_data.reshape(length,4)
     ai_data = np.zeros((length,2))
@@ -38,32 +248,11 @@ def psk16_modulate(in_data,fc,fs,N):
     ratio = int(fc/fs)
     out_data =np.zeros(length*N*ratio)
 
-    carrier=np.zeros((N,2))
-    for i in range(N):
-        carrier[i] = [math.cos(2*math.pi/(N-1)*i),-math.sin(2*math.pi/(N-1)*i)]
-
-    phasetab = np.array(
-        [[0.9807852804032304,0.19509032201612825],
-        [0.8314696123025452,0.5555702330196022],
-        [0.5555702330196023,0.8314696123025452],
-        [0.19509032201612833,0.9807852804032304],
-        [-0.1950903220161282,0.9807852804032304],
-        [-0.555570233019602,0.8314696123025453],
-        [-0.8314696123025453,0.5555702330196022],
-        [-0.9807852804032304,0.1950903220161286],
-        [-0.9807852804032304,-0.19509032201612836],
-        [-0.8314696123025455,-0.555570233019602],
-        [-0.5555702330196022,-0.8314696123025452],
-        [-0.19509032201612866,-0.9807852804032303],
-        [0.1950903220161283,-0.9807852804032304],
-        [0.5555702330196026,-0.831469612302545],
-        [0.8314696123025452,-0.5555702330196022],
-        [0.9807852804032303,-0.19509032201612872]]
-    )
+    carrier = _carrier(N)
 
     for i in range(length):
         dec_data = in_data[i,0]*8+in_data[i,1]*4+in_data[i,2]*2+in_data[i,3]
-        ai_data[i] = phasetab[int(dec_data)]
+        ai_data[i] = PHASETAB[int(dec_data)]
         a,b = ai_data[i][0],ai_data[i][1]
         for j in range(N):
             for k in range(ratio):
@@ -71,7 +260,61 @@ def psk16_modulate(in_data,fc,fs,N):
 
     return out_data
 
-def psk16_correlated_demodulate(in_data,fc,fs,N):
+
+def psk16_modulate_fast(in_data,fc,fs,N,out=None,dtype=np.float64,mapping='natural'):
+    """
+    Apply 16PSK modulation to the input signal, vectorized
+
+    All symbols are mapped through the constellation at once and one
+    carrier period per symbol is broadcast over the `fc/fs` periods of the
+    symbol, the waveform is identical to `psk16_modulate`.
+
+    Parameters
+    -----------
+    in_data: ndarray(n) or Bitstream
+        A-law encoded signal
+
+    fc: int
+        carrier frequency
+
+    fs: int
+        symbol rate
+
+    N: int
+        data per analog period
+
+    out: ndarray(n*N*fc/(fs*4)), optional
+        preallocated output buffer, its dtype overrides `dtype`
+
+    dtype: numpy dtype
+        dtype of the allocated output buffer
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    Returns
+    -----------
+    out_data: ndarray(n*N*fc/(fs*4))
+        modulated signal
+    """
+    symbols = _symbols(in_data, mapping)
+    length = len(symbols)
+    ratio = int(fc/fs)
+
+    if out is None:
+        out = np.empty(length*N*ratio, dtype=dtype)
+    elif out.shape != (length*N*ratio,) or not out.flags.c_contiguous:
+        raise ValueError('output buffer must be contiguous with shape (%d,)' % (length*N*ratio))
+
+    carrier = _carrier(N)
+    ai_data = PHASETAB[symbols]
+    # 每个码元一个载波周期的波形，再沿码元内的ratio个周期广播
+    period = ai_data[:,0:1]*carrier[:,0] + ai_data[:,1:2]*carrier[:,1]
+    out.reshape(length,ratio,N)[...] = period[:,np.newaxis,:]
+
+    return out
+
+def psk16_correlated_demodulate(in_data,fc,fs,N,packed=False):
     """
     Apply 16PSK correlated demodulation to the input signal
 
@@ -89,9 +332,12 @@ def psk16_correlated_demodulate(in_data,fc,fs,N):
     N: int
         data per analog period
 
+    packed: bool
+        return the decided bits as a Bitstream
+
     Returns
     -----------
-    out_data: ndarray(n*N*fc/(fs*4))
+    out_data: ndarray(n*N*fc/(fs*4)) or Bitstream
         modulated signal
     
     Author
@@ -102,35 +348,10 @@ def psk16_correlated_demodulate(in_data,fc,fs,N):
     length = len(in_data)//(ratio*N)
     out_data = np.zeros((length,4))
 
-    # 相关解调本地载波信号的生成
-    carrier_n = np.zeros((N,2))
-    for i in range(N):
-        carrier_n[i] = [math.cos(2*math.pi/(N-1)*i),-math.sin(2*math.pi/(N-1)*i)]
-
-    # 16PSK星座图角度表
-    angletab = np.zeros(16)
-    for i in range(16):
-        angletab[i] = math.pi*i/8+math.pi/16
-
-    # 角度值的十进制转换为二进制编码输出
-    dec2bin = np.array(
-        [[0,0,0,0],
-        [0,0,0,1],
-        [0,0,1,0],
-        [0,0,1,1],
-        [0,1,0,0],
-        [0,1,0,1],
-        [0,1,1,0],
-        [0,1,1,1],
-        [1,0,0,0],
-        [1,0,0,1],
-        [1,0,1,0],
-        [1,0,1,1],
-        [1,1,0,0],
-        [1,1,0,1],
-        [1,1,1,0],
-        [1,1,1,1]]
-    )
+    # 相关解调本地载波信号与星座图角度表
+    carrier_n = _carrier(N)
+    angletab = ANGLETAB
+    dec2bin = DEC2BIN
     
     for i in range(length):
         r1 = 0
@@ -158,10 +379,194 @@ def psk16_correlated_demodulate(in_data,fc,fs,N):
         code_bin = dec2bin[code_dec]
         out_data[i] = code_bin
 
+    if packed:
+        return Bitstream.from_bits(out_data)
     return out_data.reshape(length*4)
 
 
-def psk16_coherent_demodulate(in_data,fc,fs,N):
+def _decide(r1,r2):
+    """
+    Decide the 16PSK symbol index from the correlator outputs
+
+    The angle of (r1,r2) is quantized into the 16 sectors of width pi/8,
+    a received angle on a sector boundary belongs to the lower sector as in
+    the loop demodulators. The angles are computed in the precision of the
+    inputs, the indices are returned as uint8.
+    """
+    angle_received = np.arctan2(r2,r1)
+    angle_received[angle_received < 0] += 2*math.pi
+    code_dec = np.ceil(angle_received*8/math.pi).astype(np.int8)
+    code_dec -= 1
+    np.clip(code_dec, 0, 15, out=code_dec)
+
+    # r1为0时atan(r2/r1)为±pi/2，r1与r2均为0时判为0
+    axis = r1 == 0
+    code_dec[axis] = np.where(r2[axis] > 0, 3, np.where(r2[axis] < 0, 11, 0))
+    return code_dec.view(np.uint8)
+
+
+def symbol_bits(code_dec,packed=False,mapping='natural'):
+    """
+    Convert symbol indices to their 4-bit binary codes
+
+    Parameters
+    -----------
+    code_dec: ndarray(n)
+        symbol indices
+
+    packed: bool
+        return the bits as a Bitstream
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    Returns
+    -----------
+    out_data: ndarray(n*4), uint8 or Bitstream
+        binary codes of the symbols, MSB first
+    """
+    if _mapping_key(mapping) != 'natural':
+        code_dec = mapping_tables(mapping)[1][code_dec]
+    code_dec = code_dec.astype(np.uint8, copy=False)
+    if packed:
+        # 两个码元恰好组成一个字节
+        length = len(code_dec)
+        if length % 2:
+            code_dec = np.append(code_dec, np.uint8(0))
+        return Bitstream((code_dec[0::2] << 4) | code_dec[1::2], 4*length)
+    return np.unpackbits(code_dec[:,np.newaxis], axis=1)[:,4:].reshape(-1)
+
+
+def psk16_correlated_demodulate_fast(in_data,fc,fs,N,packed=False,mapping='natural'):
+    """
+    Apply 16PSK correlated demodulation to the input signal, vectorized
+
+    The received signal is reshaped to one row per symbol and projected
+    onto the local carrier tiled over the symbol with one matrix product,
+    all symbols are then decided at once from the angle of (r1,r2).
+
+    Parameters
+    -----------
+    in_data: ndarray(n)
+        16PSK modulated signal
+
+    fc: int
+        carrier frequency
+
+    fs: int
+        symbol rate
+
+    N: int
+        data per analog period
+
+    packed: bool
+        return the decided bits as a Bitstream
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    Returns
+    -----------
+    out_data: ndarray(n*4*fs/(N*fc)), uint8 or Bitstream
+        demodulated signal
+    """
+    ratio = int(fc/fs)
+    length = len(in_data)//(ratio*N)
+
+    # 基信号与接收信号相乘并积分
+    carrier_n = _carrier_tiled(N, ratio, np.float32 if in_data.dtype == np.float32 else np.float64)
+    r = in_data[:length*ratio*N].reshape(length,ratio*N) @ carrier_n
+
+    code_dec = _decide(r[:,0], r[:,1])
+    return symbol_bits(code_dec, packed, mapping)
+
+
+def symbol_llr(r,N,ratio,amp=None,mapping='natural'):
+    """
+    Max-log bit LLRs of 16PSK symbols from their correlator outputs
+
+    The correlator output of constellation point p is r = ratio*G@p plus
+    Gaussian noise of covariance amp**2*ratio*G (see `carrier_gram`), so the
+    log-likelihood of p is (p@r - ratio*p@G@p/2)/amp**2 up to a constant.
+    The metrics of the 16 points are computed with one matrix product and
+    the LLR of each bit is the best metric with the bit 0 minus the best
+    metric with the bit 1.
+
+    Parameters
+    -----------
+    r: ndarray(n,2)
+        correlator outputs (r1,r2) of the symbols
+
+    N: int
+        data per analog period
+
+    ratio: int
+        carrier periods per symbol (fc/fs)
+
+    amp: float, optional
+        standard deviation of the channel noise, the LLRs are not scaled if
+        not given (enough for hard decisions and max-log decoding)
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    Returns
+    -----------
+    llr: ndarray(n*4)
+        LLRs of the bits of the symbols, MSB first, positive for a 0 bit
+    """
+    energy = ratio*np.einsum('ij,jk,ik->i', PHASETAB, carrier_gram(N), PHASETAB)/2
+    metric = r @ PHASETAB.T - energy
+    if amp is not None:
+        metric /= amp**2
+
+    # 各比特为0与为1的星座点中的最大度量之差
+    labels = DEC2BIN[mapping_tables(mapping)[1]]
+    llr = np.empty((len(r),4), dtype=metric.dtype)
+    for k in range(4):
+        zero = labels[:,k] == 0
+        llr[:,k] = metric[:,zero].max(axis=1) - metric[:,~zero].max(axis=1)
+    return llr.reshape(-1)
+
+
+def psk16_correlated_demodulate_llr(in_data,fc,fs,N,amp=None,mapping='natural'):
+    """
+    Apply 16PSK correlated demodulation to the input signal with soft
+    outputs, see `symbol_llr`
+
+    Parameters
+    -----------
+    in_data: ndarray(n)
+        16PSK modulated signal
+
+    fc: int
+        carrier frequency
+
+    fs: int
+        symbol rate
+
+    N: int
+        data per analog period
+
+    amp: float, optional
+        standard deviation of the channel noise
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    Returns
+    -----------
+    llr: ndarray(n*4*fs/(N*fc))
+        bit LLRs, positive for a 0 bit
+    """
+    ratio = int(fc/fs)
+    length = len(in_data)//(ratio*N)
+    carrier_n = _carrier_tiled(N, ratio, np.float32 if in_data.dtype == np.float32 else np.float64)
+    r = in_data[:length*ratio*N].reshape(length,ratio*N) @ carrier_n
+    return symbol_llr(r, N, ratio, amp, mapping)
+
+
+def psk16_coherent_demodulate(in_data,fc,fs,N,packed=False):
     """
     Apply 16PSK coherent demodulation to the input signal
 
@@ -179,9 +584,12 @@ def psk16_coherent_demodulate(in_data,fc,fs,N):
     N: int
         data per analog period
 
+    packed: bool
+        return the decided bits as a Bitstream
+
     Returns
     -----------
-    out_data: ndarray(n*N*fc/(fs*4))
+    out_data: ndarray(n*N*fc/(fs*4)) or Bitstream
         modulated signal
     
     By SCUT Zening Lin, Yushu Li, Qiheng Tan, Qingfeng Wang on 2020-01-07
@@ -190,42 +598,13 @@ def psk16_coherent_demodulate(in_data,fc,fs,N):
     length = len(in_data)//(ratio*N)
     out_data = np.zeros((length,4))
 
-    # 相干解调本地载波信号的生成
-    carrier_n = np.zeros((N,2))
-    for i in range(N):
-        carrier_n[i] = [math.cos(2*math.pi/(N-1)*i),-math.sin(2*math.pi/(N-1)*i)]
-
-    # 16PSK星座图角度表
-    angletab = np.zeros(16)
-    for i in range(16):
-        angletab[i] = math.pi*i/8+math.pi/16
-
-    # 角度值的十进制转换为二进制编码输出
-    dec2bin = np.array(
-        [[0,0,0,0],
-        [0,0,0,1],
-        [0,0,1,0],
-        [0,0,1,1],
-        [0,1,0,0],
-        [0,1,0,1],
-        [0,1,1,0],
-        [0,1,1,1],
-        [1,0,0,0],
-        [1,0,0,1],
-        [1,0,1,0],
-        [1,0,1,1],
-        [1,1,0,0],
-        [1,1,0,1],
-        [1,1,1,0],
-        [1,1,1,1]]
-    )
+    # 相干解调本地载波信号与星座图角度表
+    carrier_n = _carrier(N)
+    angletab = ANGLETAB
+    dec2bin = DEC2BIN
 
     in_data_c = np.zeros((length,N))  # 存放与cos相乘后的数据
     in_data_s = np.zeros((length,N))  # 存放与-sin相乘后的数据
-    F_in_data_c = np.zeros((length,512))  # 存放与cos相乘后的频谱数据
-    F_in_data_s = np.zeros((length,512))  # 存放与-sin相乘后的频谱数据
-    # 采用8阶IIR巴特沃斯滤波器
-    LP_filter_b, LP_filter_a = scipy.signal.butter(8, 1/N)
 
     # 基信号与接收信号相乘    
     for i in range(length):
@@ -255,9 +634,451 @@ def psk16_coherent_demodulate(in_data,fc,fs,N):
         code_bin = dec2bin[code_dec]
         out_data[i] = code_bin
 
+    if packed:
+        return Bitstream.from_bits(out_data)
     return out_data.reshape(length*4)
 
 
+class CoherentDemodulator:
+    """
+    Block-wise 16PSK coherent demodulator
+
+    The received signal is mixed with the local carrier and the I/Q streams
+    are low-pass filtered by an 8th order Butterworth filter in second
+    order sections, the filter state is carried from one block to the
+    next. Each symbol is decided from the filtered I/Q integrated over the
+    samples of the symbol, delayed by the group delay of the filter, so
+    the noise is averaged over the whole symbol and feeding the signal in
+    blocks gives the same decisions as feeding it at once.
+
+    Parameters
+    -----------
+    fc: int
+        carrier frequency
+
+    fs: int
+        symbol rate
+
+    N: int
+        data per analog period
+
+    dtype: numpy dtype
+        precision of the mixing and filtering, float64 or float32
+    """
+    __slots__ = ('N', 'ratio', 'dtype', 'carrier', 'sos', 'sosfilt', 'zi', 'delay', 'position',
+                 'symbol', 'partial')
+
+    def __init__(self,fc,fs,N,dtype=np.float64):
+        # scipy.signal导入较慢，只在使用相干解调时导入
+        import scipy.signal
+
+        self.N = N
+        self.ratio = int(fc/fs)
+        self.dtype = float_dtype(dtype)
+        self.carrier = _carrier(N).T.astype(self.dtype)
+        # 采用8阶IIR巴特沃斯滤波器，级联二阶节实现
+        sos = scipy.signal.butter(8, 1/N, output='sos')
+        # 滤波器在直流处的群时延，各二阶节时延相加
+        delay = 0
+        for section in sos:
+            delay += scipy.signal.group_delay((section[:3], section[3:]), w=[0])[1][0]
+        self.delay = int(round(delay))
+        self.sos = sos.astype(self.dtype)
+        self.sosfilt = scipy.signal.sosfilt
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the filter state to start a new signal
+        """
+        self.zi = np.zeros((self.sos.shape[0],2,2), dtype=self.dtype)
+        self.position = 0
+        self.symbol = 0
+        self.partial = np.zeros(2, dtype=self.dtype)
+
+    def process(self,in_data):
+        """
+        Filter the next block of the received signal
+
+        Parameters
+        -----------
+        in_data: ndarray(n)
+            next block of the 16PSK modulated signal
+
+        Returns
+        -----------
+        code_dec: ndarray(m)
+            indices of the symbols whose delayed integration window ends in
+            the block
+        """
+        length = len(in_data)
+        period = self.ratio*self.N
+        # 与本地载波相乘，载波相位由样点的绝对位置决定
+        phase = (self.position + np.arange(length)) % self.N
+        mixed = self.carrier[:,phase] * in_data.astype(self.dtype, copy=False)
+        filtered, self.zi = self.sosfilt(self.sos, mixed, axis=-1, zi=self.zi)
+
+        # 第k个码元的积分区间为[k*period+delay, (k+1)*period+delay)，开头delay个样点为滤波器暂态
+        skip = max(0, self.delay - self.position)
+        filtered = filtered[:,skip:]
+        offset = (self.position + skip - self.delay) % period
+        self.position += length
+        if offset + filtered.shape[1] < period:
+            self.partial += filtered.sum(axis=1)
+            return _decide(np.zeros(0, dtype=self.dtype), np.zeros(0, dtype=self.dtype))
+
+        # 补齐上一块中未完成的码元，再对完整码元逐段积分
+        first = period - offset
+        count = (filtered.shape[1] - first)//period
+        sums = np.empty((2,count+1), dtype=self.dtype)
+        sums[:,0] = self.partial + filtered[:,:first].sum(axis=1)
+        sums[:,1:] = filtered[:,first:first+count*period].reshape(2,count,period).sum(axis=2)
+        self.partial = filtered[:,first+count*period:].sum(axis=1)
+        self.symbol += count + 1
+        return _decide(sums[0], sums[1])
+
+    def flush(self):
+        """
+        Decide the remaining symbols of the signal, whose delayed
+        integration window extends past its end
+
+        The filter is run on zeros over the group delay, so each remaining
+        symbol is still decided from its own filtered samples.
+
+        Returns
+        -----------
+        code_dec: ndarray(m)
+            indices of the remaining symbols
+        """
+        period = self.ratio*self.N
+        pad = self.position//period*period + self.delay - self.position
+        if self.position//period <= self.symbol or pad <= 0:
+            return _decide(np.zeros(0, dtype=self.dtype), np.zeros(0, dtype=self.dtype))
+        return self.process(np.zeros(pad, dtype=self.dtype))
+
+
+def psk16_coherent_demodulate_filtered(in_data,fc,fs,N,packed=False,chunk=65536,mapping='natural'):
+    """
+    Apply 16PSK coherent demodulation to the input signal with a real
+    low-pass filter, vectorized
+
+    Parameters
+    -----------
+    in_data: ndarray(n)
+        16PSK modulated signal
+
+    fc: int
+        carrier frequency
+
+    fs: int
+        symbol rate
+
+    N: int
+        data per analog period
+
+    packed: bool
+        return the decided bits as a Bitstream
+
+    chunk: int
+        number of symbols filtered per block, bounds the working memory
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    Returns
+    -----------
+    out_data: ndarray(n*4*fs/(N*fc)), uint8 or Bitstream
+        demodulated signal
+    """
+    demodulator = CoherentDemodulator(fc,fs,N,np.float32 if in_data.dtype == np.float32 else np.float64)
+    ratio = int(fc/fs)
+    length = len(in_data)//(ratio*N)
+    block = chunk*ratio*N
+
+    code_dec = [demodulator.process(in_data[i:i+block]) for i in range(0, length*ratio*N, block)]
+    code_dec.append(demodulator.flush())
+    return symbol_bits(np.concatenate(code_dec), packed, mapping)
+
+
+
+@functools.lru_cache(maxsize=None)
+def carrier_gram(N):
+    """
+    Gram matrix C^T C of the local carrier C over one analog period
+
+    The sampled cos and -sin columns of the carrier are not exactly
+    orthogonal (the period spans N samples of phase step 2pi/(N-1)), so the
+    correlator output of a symbol is ratio*G@[a,b] rather than a scaled
+    constellation point. The matrix is cached per N and read-only.
+    """
+    carrier = _carrier(N)
+    gram = carrier.T @ carrier
+    gram.flags.writeable = False
+    return gram
+
+
+def psk16_baseband_modulate(in_data,fc,fs,N,mapping='natural',dtype=np.float64):
+    """
+    Apply 16PSK modulation in the complex baseband, one sample per symbol
+
+    Each symbol is the noiseless output (r1 + j*r2) of the correlation
+    demodulator for the passband waveform of `psk16_modulate`, i.e.
+    ratio*G@[a,b] with G = `carrier_gram(N)`. Together with
+    `channel.AWGN_baseband` and `psk16_baseband_demodulate` this gives the
+    same symbol decisions statistics as the passband link without
+    synthesizing the ratio*N samples of every symbol.
+
+    Parameters
+    -----------
+    in_data: ndarray(n) or Bitstream
+        A-law encoded signal
+
+    fc: int
+        carrier frequency
+
+    fs: int
+        symbol rate
+
+    N: int
+        data per analog period
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    dtype: numpy dtype
+        precision of the symbols, float64 gives complex128 symbols and
+        float32 complex64
+
+    Returns
+    -----------
+    out_data: ndarray(n/4), complex
+        baseband symbols
+    """
+    ratio = int(fc/fs)
+    r = ratio*(PHASETAB[_symbols(in_data, mapping)] @ carrier_gram(N))
+    return _complex(r, dtype)
+
+
+def _complex(r,dtype=np.float64):
+    """
+    Complex symbols r1 + j*r2 of the given real precision
+    """
+    out_data = np.empty(len(r), dtype=np.result_type(float_dtype(dtype), np.complex64))
+    out_data.real = r[:,0]
+    out_data.imag = r[:,1]
+    return out_data
+
+
+def psk16_baseband_demodulate(in_data,packed=False,mapping='natural'):
+    """
+    Decide complex baseband symbols with the correlation demodulator rule
+
+    Parameters
+    -----------
+    in_data: ndarray(n), complex
+        received baseband symbols
+
+    packed: bool
+        return the decided bits as a Bitstream
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    Returns
+    -----------
+    out_data: ndarray(n*4), uint8 or Bitstream
+        demodulated signal
+    """
+    code_dec = _decide(np.ascontiguousarray(in_data.real), np.ascontiguousarray(in_data.imag))
+    return symbol_bits(code_dec, packed, mapping)
+
+
+def psk16_baseband_demodulate_llr(in_data,N,ratio,amp=None,mapping='natural'):
+    """
+    Bit LLRs of complex baseband symbols, see `symbol_llr`
+
+    Parameters
+    -----------
+    in_data: ndarray(n), complex
+        received baseband symbols
+
+    N: int
+        data per analog period
+
+    ratio: int
+        carrier periods per symbol (fc/fs)
+
+    amp: float, optional
+        standard deviation of the passband channel noise
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+
+    Returns
+    -----------
+    llr: ndarray(n*4)
+        bit LLRs, positive for a 0 bit
+    """
+    r = np.stack([in_data.real, in_data.imag], axis=1)
+    return symbol_llr(r, N, int(ratio), amp, mapping)
+
+
+
+class PSK16Modem:
+    """
+    16PSK modulator and correlation demodulator for fixed carrier parameters
+
+    The carrier, the tiled correlator matrix and the Gram matrix are taken
+    from the shared caches once at construction, and the intermediate
+    arrays of `modulate` and `demodulate` are kept in work buffers grown to
+    the largest block seen, so repeated calls on blocks of similar size
+    (sweeps, streaming) allocate only their outputs. The results are
+    identical to `psk16_modulate_fast` and `psk16_correlated_demodulate_fast`.
+    A modem is not thread-safe, use one per thread.
+
+    Parameters
+    -----------
+    N: int
+        data per analog period
+
+    ratio: int
+        carrier periods per symbol (fc/fs)
+
+    mapping: str or sequence of int
+        symbol mapping, see `mapping_tables`
+    """
+    __slots__ = ('N', 'ratio', 'mapping', 'carrier', 'gram', '_buffers')
+
+    def __init__(self,N,ratio,mapping='natural'):
+        self.N = N
+        self.ratio = int(ratio)
+        self.mapping = _mapping_key(mapping)
+        self.carrier = _carrier(N)
+        self.gram = carrier_gram(N)
+        self._buffers = {}
+
+    def __repr__(self):
+        return 'PSK16Modem(N=%d, ratio=%d, mapping=%r)' % (self.N, self.ratio, self.mapping)
+
+    def __reduce__(self):
+        return (PSK16Modem, (self.N, self.ratio, self.mapping))
+
+    def _buffer(self,name,shape,dtype=np.float64):
+        """
+        Work buffer `name` of the given shape, reallocated only when a
+        larger one is needed
+        """
+        key = (name, np.dtype(dtype))
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=dtype)
+            self._buffers[key] = buffer
+        return buffer[:size].reshape(shape)
+
+    def modulate(self,in_data,out=None,dtype=np.float64):
+        """
+        Apply 16PSK modulation, see `psk16_modulate_fast`
+
+        Parameters
+        -----------
+        in_data: ndarray(n) or Bitstream
+            A-law encoded signal
+
+        out: ndarray(n*N*ratio/4), optional
+            preallocated output buffer, its dtype overrides `dtype`
+
+        dtype: numpy dtype
+            dtype of the allocated output buffer
+
+        Returns
+        -----------
+        out_data: ndarray(n*N*ratio/4)
+            modulated signal
+        """
+        N, ratio = self.N, self.ratio
+        symbols = _symbols(in_data, self.mapping)
+        length = len(symbols)
+
+        if out is None:
+            out = np.empty(length*N*ratio, dtype=dtype)
+        elif out.shape != (length*N*ratio,) or not out.flags.c_contiguous:
+            raise ValueError('output buffer must be contiguous with shape (%d,)' % (length*N*ratio))
+
+        ai_data = np.take(PHASETAB, symbols, axis=0, out=self._buffer('ai', (length,2)))
+        period = self._buffer('period', (length,N))
+        quadrature = self._buffer('quadrature', (length,N))
+        # 与psk16_modulate_fast相同的运算顺序，结果逐位一致
+        np.multiply(ai_data[:,0:1], self.carrier[:,0], out=period)
+        np.multiply(ai_data[:,1:2], self.carrier[:,1], out=quadrature)
+        period += quadrature
+        out.reshape(length,ratio,N)[...] = period[:,np.newaxis,:]
+        return out
+
+    def correlate(self,in_data):
+        """
+        Correlator outputs (r1,r2) of every symbol of a passband signal
+
+        Returns
+        -----------
+        r: ndarray(m,2)
+            view of a work buffer, valid until the next call
+        """
+        period = self.ratio*self.N
+        length = len(in_data)//period
+        dtype = np.float32 if in_data.dtype == np.float32 else np.float64
+        carrier_n = _carrier_tiled(self.N, self.ratio, dtype)
+        r = self._buffer('r', (length,2), dtype)
+        return np.matmul(in_data[:length*period].reshape(length,period), carrier_n, out=r)
+
+    def demodulate(self,in_data,packed=False):
+        """
+        Apply 16PSK correlated demodulation, see
+        `psk16_correlated_demodulate_fast`
+
+        Parameters
+        -----------
+        in_data: ndarray(n)
+            16PSK modulated signal
+
+        packed: bool
+            return the decided bits as a Bitstream
+
+        Returns
+        -----------
+        out_data: ndarray(n*4/(N*ratio)), uint8 or Bitstream
+            demodulated signal
+        """
+        r = self.correlate(in_data)
+        return symbol_bits(_decide(r[:,0], r[:,1]), packed, self.mapping)
+
+    def demodulate_llr(self,in_data,amp=None):
+        """
+        Bit LLRs of a passband signal, see `psk16_correlated_demodulate_llr`
+        """
+        return symbol_llr(self.correlate(in_data), self.N, self.ratio, amp, self.mapping)
+
+    def baseband_modulate(self,in_data,dtype=np.float64):
+        """
+        Complex baseband symbols of the input bits, see
+        `psk16_baseband_modulate`
+        """
+        r = self.ratio*(PHASETAB[_symbols(in_data, self.mapping)] @ self.gram)
+        return _complex(r, dtype)
+
+    def baseband_demodulate(self,in_data,packed=False):
+        """
+        Decide complex baseband symbols, see `psk16_baseband_demodulate`
+        """
+        return psk16_baseband_demodulate(in_data, packed, self.mapping)
+
+    def baseband_demodulate_llr(self,in_data,amp=None):
+        """
+        Bit LLRs of complex baseband symbols, see
+        `psk16_baseband_demodulate_llr`
+        """
+        return psk16_baseband_demodulate_llr(in_data, self.N, self.ratio, amp, self.mapping)
+
 
 if __name__ == "__main__":
     # 测试数据：所有4位二进制数
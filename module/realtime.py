@@ -0,0 +1,523 @@
+import asyncio
+import concurrent.futures
+import math
+import threading
+import time
+
+import numpy as np
+
+import module.audio_func as audio_func
+import module.backend as backend
+import module.channel as channel
+import module.pipeline as pipeline
+import module.psk16 as psk16
+
+# 每帧的样点数，8kHz采样时为64ms
+DEFAULT_FRAME = 512
+# 相邻两级之间队列的容量(帧)，队列满时上游等待
+DEFAULT_QUEUE = 4
+# 实时信源未知最大幅值时按16位满量程做PCM归一化
+FULL_SCALE = 32767
+
+
+class Frame:
+    """
+    One frame of audio travelling through the real-time link
+
+    Attributes
+    -----------
+    index: int
+        frame number
+
+    start: int
+        absolute position of the first sample in the stream
+
+    captured: float
+        `time.perf_counter` instant at which the last sample of the frame
+        was captured, the origin of its end to end latency
+
+    data: ndarray or Bitstream
+        samples, then the output of every stage
+
+    codes: ndarray, uint8
+        PCM codewords sent, to count the codewords received in error
+
+    errors: int
+        number of PCM codewords of the frame received in error
+    """
+    __slots__ = ('index', 'start', 'captured', 'data', 'codes', 'errors')
+
+    def __init__(self, index, start, captured, data):
+        self.index = index
+        self.start = start
+        self.captured = captured
+        self.data = data
+        self.codes = None
+        self.errors = 0
+
+    def __repr__(self):
+        return 'Frame(index=%d, start=%d, samples=%d)' % (self.index, self.start, len(self.data))
+
+
+async def wav_source(path, frame=DEFAULT_FRAME, realtime=True):
+    """
+    Read a mono 16-bit wav file frame by frame as a capture device would
+
+    With `realtime` each frame is released when its last sample would have
+    been captured at the sampling rate of the file, and that instant is its
+    capture time, so a link that cannot keep up shows a growing latency.
+    Without it frames are read as fast as the link accepts them.
+
+    Yields
+    -----------
+    frame: Frame
+        next frame of samples, int16
+    """
+    fs, data = audio_func.audioread(path, mmap=True)
+    if data.ndim != 1 or data.dtype != np.int16:
+        raise ValueError('%s is not a mono 16-bit wav file' % path)
+    origin = time.perf_counter()
+    for index, start in enumerate(range(0, len(data), frame)):
+        samples = np.array(data[start:start+frame])
+        if realtime:
+            captured = origin + (start + len(samples))/fs
+            delay = captured - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            captured = time.perf_counter()
+        yield Frame(index, start, captured, samples)
+
+
+class LoopbackSource:
+    """
+    Local loopback standing in for a capture device
+
+    Samples are written from any thread (the audio callback of a device,
+    or `loopback_feed`) and cut into frames timestamped on arrival. Like a
+    device buffer, the loopback cannot wait for the link: a frame arriving
+    while `maxsize` frames are already waiting is dropped and counted in
+    `overruns`. Create the source inside the running event loop and
+    iterate it with `async for`.
+
+    Parameters
+    -----------
+    frame: int
+        number of samples per frame
+
+    maxsize: int
+        number of frames buffered before overruns
+    """
+
+    def __init__(self, frame=DEFAULT_FRAME, maxsize=4*DEFAULT_QUEUE):
+        self.frame = frame
+        self.overruns = 0
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize)
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._position = 0
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def _deliver(self, frame):
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overruns += 1
+
+    def write(self, samples):
+        """
+        Append captured samples, thread-safe
+        """
+        with self._lock:
+            pending = np.concatenate([self._pending, np.asarray(samples, dtype=np.int16)])
+            count = len(pending)//self.frame
+            captured = time.perf_counter()
+            for k in range(count):
+                frame = Frame(self._index, self._position, captured,
+                              pending[k*self.frame:(k+1)*self.frame].copy())
+                self._index += 1
+                self._position += self.frame
+                self._loop.call_soon_threadsafe(self._deliver, frame)
+            self._pending = pending[count*self.frame:]
+
+    def close(self):
+        """
+        Deliver the incomplete last frame and end the stream, thread-safe
+        """
+        with self._lock:
+            if len(self._pending):
+                frame = Frame(self._index, self._position, time.perf_counter(), self._pending)
+                self._loop.call_soon_threadsafe(self._deliver, frame)
+                self._pending = np.zeros(0, dtype=np.int16)
+            # 结束标记不可丢弃，等待队列有空位
+            asyncio.run_coroutine_threadsafe(self._queue.put(None), self._loop)
+
+    async def __aiter__(self):
+        while True:
+            frame = await self._queue.get()
+            if frame is None:
+                return
+            yield frame
+
+
+def loopback_feed(source, data, fs, block=None, realtime=True):
+    """
+    Write `data` into a `LoopbackSource` from a background thread, in
+    blocks of `block` samples (the frame size by default) paced at the
+    sampling rate `fs` when `realtime`, then close the source
+
+    Returns
+    -----------
+    thread: threading.Thread
+        the started feeding thread
+    """
+    block = block or source.frame
+
+    def feed():
+        origin = time.perf_counter()
+        for start in range(0, len(data), block):
+            samples = data[start:start+block]
+            if realtime:
+                delay = origin + (start + len(samples))/fs - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            source.write(samples)
+        source.close()
+
+    thread = threading.Thread(target=feed, name='loopback-feed', daemon=True)
+    thread.start()
+    return thread
+
+
+class LatencyStats:
+    """
+    End to end latency and jitter of the delivered frames
+
+    The latency of a frame is the time between the capture of its last
+    sample and its delivery to the sink. The jitter is the interarrival
+    jitter of RFC 3550, the running mean of the absolute latency change
+    between consecutive frames with gain 1/16.
+    """
+    __slots__ = ('latencies', 'jitter', 'samples', 'errors', '_first', '_last')
+
+    def __init__(self):
+        self.latencies = []
+        self.jitter = 0.0
+        self.samples = 0
+        self.errors = 0
+        self._first = None
+        self._last = None
+
+    def add(self, frame, delivered):
+        latency = delivered - frame.captured
+        if self.latencies:
+            self.jitter += (abs(latency - self.latencies[-1]) - self.jitter)/16
+        else:
+            self._first = frame.captured
+        self.latencies.append(latency)
+        self.samples += len(frame.data)
+        self.errors += frame.errors
+        self._last = delivered
+
+    def summary(self, fs=None):
+        """
+        Returns
+        -----------
+        stats: dict
+            number of frames, samples and PCM codewords in error, latency
+            mean, percentiles, maximum and standard deviation and jitter in
+            ms, and with `fs` the real time factor (audio duration over the
+            time from the first capture to the last delivery)
+        """
+        stats = {'frames': len(self.latencies), 'samples': self.samples, 'errors': self.errors}
+        if self.latencies:
+            latencies = np.array(self.latencies)*1e3
+            stats.update({'latency_mean_ms': float(latencies.mean()),
+                          'latency_p50_ms': float(np.percentile(latencies, 50)),
+                          'latency_p95_ms': float(np.percentile(latencies, 95)),
+                          'latency_max_ms': float(latencies.max()),
+                          'latency_std_ms': float(latencies.std()),
+                          'jitter_ms': self.jitter*1e3})
+            elapsed = self._last - self._first
+            if fs and elapsed > 0:
+                stats['realtime_factor'] = self.samples/fs/elapsed
+        return stats
+
+
+class LinkStages:
+    """
+    Frame by frame transmitter, channel and receiver of the link
+
+    The three stages keep their own state (modems, channel position) and
+    each one is only ever called for one frame at a time, so they can run
+    concurrently on different executor threads. Only correlation
+    demodulation is supported: it decides every symbol inside its frame,
+    so each frame comes out of the receiver with its own samples.
+
+    Parameters
+    -----------
+    fs: int
+        sampling rate, used as the symbol rate
+
+    fc_ratio: int
+        carrier frequency in multiples of the symbol rate
+
+    N: int
+        data per analog period
+
+    vp: float
+        PCM normalization amplitude
+
+    model: channel.ChannelModel
+        channel applied to the signal
+
+    mode: str
+        'passband' or 'baseband' simulation of the modem and channel
+
+    mapping: str or sequence of int
+        16PSK symbol mapping, see `psk16.mapping_tables`
+
+    dtype: numpy dtype
+        precision of the signal, see `psk16.DTYPES`
+    """
+    __slots__ = ('fs', 'fc_ratio', 'N', 'vp', 'model', 'mode', 'mapping', 'dtype')
+
+    def __init__(self, fs, fc_ratio, N, vp, model, mode='passband', mapping='natural', dtype=np.float64):
+        if mode not in ('passband', 'baseband'):
+            raise ValueError('unknown simulation mode %r' % mode)
+        self.fs = fs
+        self.fc_ratio = fc_ratio
+        self.N = N
+        self.vp = vp
+        self.model = model
+        self.mode = mode
+        self.mapping = mapping
+        self.dtype = psk16.float_dtype(dtype)
+
+    def transmit(self, frame):
+        """
+        PCM encoding, (12,8) coding and 16PSK modulation of a frame
+        """
+        stream = backend.kernel('pcm_encode')(frame.data, self.vp)[0]
+        frame.codes = stream.data
+        stream = psk16.map_symbols(backend.kernel('correction_en')(stream), self.mapping)
+        if self.mode == 'baseband':
+            frame.data = psk16.psk16_baseband_modulate(stream, self.fc_ratio*self.fs, self.fs, self.N,
+                                                       dtype=self.dtype)
+        else:
+            frame.data = backend.kernel('psk16_modulate')(stream, self.fc_ratio*self.fs, self.fs,
+                                                          self.N, self.dtype)
+
+    def channel(self, frame):
+        """
+        Channel of a frame, at the absolute position of its first symbol
+        """
+        # 每个样点对应3个码元
+        offset = 3*frame.start if self.mode == 'baseband' else 3*self.fc_ratio*self.N*frame.start
+        frame.data = self.model(frame.data, offset, inplace=True)
+
+    def receive(self, frame):
+        """
+        Demodulation, (12,8) decoding and PCM decoding of a frame
+        """
+        if self.mode == 'baseband':
+            stream = psk16.psk16_baseband_demodulate(frame.data, packed=True)
+        else:
+            stream = backend.kernel('psk16_correlated_demodulate')(frame.data, self.fc_ratio*self.fs,
+                                                                   self.fs, self.N)
+        stream = backend.kernel('correction_de')(psk16.demap_symbols(stream, self.mapping))
+        codes = stream.data[:stream.length//8]
+        frame.errors = int(np.count_nonzero(codes != frame.codes))
+        frame.data = backend.kernel('pcm_decode')(stream, self.vp, self.dtype)
+
+
+async def _produce(source, outbox):
+    async for frame in source:
+        await outbox.put(frame)
+    await outbox.put(None)
+
+
+async def _stage(func, inbox, outbox, executor):
+    """
+    Apply `func` to every frame of `inbox` on the executor and pass the
+    frame on, waiting while `outbox` is full
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        frame = await inbox.get()
+        if frame is None:
+            await outbox.put(None)
+            return
+        await loop.run_in_executor(executor, func, frame)
+        await outbox.put(frame)
+
+
+async def _consume(inbox, stats, sink):
+    while True:
+        frame = await inbox.get()
+        if frame is None:
+            return
+        stats.add(frame, time.perf_counter())
+        if sink is not None:
+            sink(frame)
+
+
+async def run_link(source, fs, fc_ratio=10, N=10, amp=0.3, vp=FULL_SCALE, mode='passband',
+                   seed=None, channel_model=None, mapping='natural', dtype=np.float64,
+                   queue_size=DEFAULT_QUEUE, executor=None, sink=None):
+    """
+    Run the link live on the frames of an asynchronous source
+
+    The source, the transmitter, the channel, the receiver and the sink
+    run as tasks connected by `asyncio.Queue`s of `queue_size` frames: a
+    stage waits while its output queue is full, so a slow stage holds back
+    the ones before it instead of letting frames pile up. The three
+    processing stages run on `executor` (a thread pool of 3 workers by
+    default, NumPy releasing the GIL) and the event loop only moves frames.
+
+    Parameters
+    -----------
+    source: async iterable of Frame
+        `wav_source`, a `LoopbackSource` or any asynchronous frame source
+
+    fs: int
+        sampling rate of the source, used as the symbol rate
+
+    fc_ratio: int
+        carrier frequency in multiples of the symbol rate
+
+    N: int
+        data per analog period
+
+    amp: float
+        noise gain of the channel
+
+    vp: float
+        PCM normalization amplitude, full scale by default since a live
+        source has no known maximum
+
+    mode: str
+        'passband' or 'baseband' simulation of the modem and channel
+
+    seed: int or None
+        seed of the channel noise
+
+    channel_model: channel.ChannelModel, optional
+        channel to use instead of AWGN of standard deviation `amp`
+
+    mapping: str or sequence of int
+        16PSK symbol mapping, see `psk16.mapping_tables`
+
+    dtype: numpy dtype
+        precision of the signal, see `psk16.DTYPES`
+
+    queue_size: int
+        capacity of every queue, in frames
+
+    executor: concurrent.futures.Executor, optional
+        executor of the processing stages
+
+    sink: callable, optional
+        called with every decoded frame, in order
+
+    Returns
+    -----------
+    stats: dict
+        see `LatencyStats.summary`
+    """
+    if channel_model is None:
+        channel_model = channel.AWGNChannel(amp, N, fc_ratio, seed)
+    stages = LinkStages(fs, fc_ratio, N, vp, channel_model, mode, mapping, dtype)
+    queues = [asyncio.Queue(queue_size) for _ in range(4)]
+    stats = LatencyStats()
+
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=3, thread_name_prefix='link')
+    tasks = [asyncio.ensure_future(_produce(source, queues[0])),
+             asyncio.ensure_future(_stage(stages.transmit, queues[0], queues[1], executor)),
+             asyncio.ensure_future(_stage(stages.channel, queues[1], queues[2], executor)),
+             asyncio.ensure_future(_stage(stages.receive, queues[2], queues[3], executor)),
+             asyncio.ensure_future(_consume(queues[3], stats, sink))]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # 任一级出错时取消其余各级，避免其在空队列上永久等待
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
+
+    summary = stats.summary(fs)
+    if isinstance(source, LoopbackSource):
+        summary['overruns'] = source.overruns
+    return summary
+
+
+def realtime_link(in_path, out_path=None, fc_ratio=10, N=10, amp=0.3, frame=DEFAULT_FRAME,
+                  realtime=True, mode='passband', seed=None, channel_model=None,
+                  mapping='natural', dtype=np.float64, queue_size=DEFAULT_QUEUE):
+    """
+    Play a wav file through the live link, see `run_link`
+
+    The PCM normalization uses the peak of the file like
+    `pipeline.stream_link`, so both links give the same decisions for the
+    same channel. With `realtime` the file is released at its sampling
+    rate, as a capture device would deliver it.
+
+    Returns
+    -----------
+    stats: dict
+        latency, jitter and error statistics, see `LatencyStats.summary`
+    """
+    fs, data = audio_func.audioread(in_path, mmap=True)
+    length = len(data)
+    del data
+    vp = pipeline.wav_peak(in_path)
+
+    if out_path is not None:
+        out_data = audio_func.audiowrite_mmap(out_path, fs, length)
+
+        def write(decoded):
+            out_data[decoded.start:decoded.start+len(decoded.data)] = decoded.data
+        sink = write
+    else:
+        sink = None
+
+    stats = asyncio.run(run_link(wav_source(in_path, frame, realtime), fs, fc_ratio, N, amp, vp, mode,
+                                 seed, channel_model, mapping, dtype, queue_size, sink=sink))
+    if out_path is not None:
+        if isinstance(out_data, np.memmap):
+            out_data.flush()
+        del out_data
+    return stats
+
+
+def _print_stats(name, stats):
+    print('%-10s %4d frames  latency %.1f ms (p95 %.1f, max %.1f)  jitter %.2f ms  x%.1f real time  %d errors' % (
+        name, stats['frames'], stats['latency_mean_ms'], stats['latency_p95_ms'],
+        stats['latency_max_ms'], stats['jitter_ms'], stats.get('realtime_factor', math.nan),
+        stats['errors']))
+
+
+if __name__ == "__main__":
+    fs, data_raw = audio_func.audioread('audio.wav')
+    data_raw = data_raw[:5*fs]
+    audio_func.audiowrite(data_raw, fs, 'audio_realtime_input.wav')
+
+    # 由wav文件按采样率实时读入
+    stats = realtime_link('audio_realtime_input.wav', 'audio_correlated_decoded_realtime.wav', seed=0)
+    _print_stats('wav', stats)
+
+    # 由后台线程写入本地回环，模拟采集设备
+    async def loopback():
+        source = LoopbackSource()
+        loopback_feed(source, data_raw, fs)
+        return await run_link(source, fs, seed=0)
+
+    stats = asyncio.run(loopback())
+    _print_stats('loopback', stats)
+    print('overruns:', stats['overruns'])
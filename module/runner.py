@@ -0,0 +1,272 @@
+import copy
+import json
+import os
+import time
+
+import numpy as np
+
+import module.audio_func as audio_func
+import module.backend as backend
+import module.channel as channel
+import module.interleaver as interleaver
+import module.metrics as metrics
+import module.parallel as parallel
+import module.pipeline as pipeline
+import module.profiling as profiling
+import module.psk16 as psk16
+
+# 单个运行配置的全部键与默认值
+DEFAULT_CONFIG = {
+    'name': 'link',
+    # 输入的单声道16位wav文件与输出文件，输出文件名可引用配置项，如{name}、{method}
+    'input': 'audio.wav',
+    'output': 'audio_{method}_decoded_{name}.wav',
+    'record': '{name}.json',
+    # 载波频率为码元速率的fc_ratio倍，每个载波周期N个点
+    'fc_ratio': 10,
+    'N': 10,
+    # 信道：噪声增益，或信道模型描述(见build_channel)
+    'amp': 0.3,
+    'channel': None,
+    'method': 'correlated',
+    'mode': 'passband',
+    'mapping': 'natural',
+    'interleaver': None,
+    # 实现选择、计算精度、分块大小与进程数
+    'backend': 'vectorized',
+    'dtype': 'float64',
+    'chunk': pipeline.DEFAULT_CHUNK,
+    'workers': 1,
+    'shard': parallel.DEFAULT_SHARD,
+    'seed': 0,
+    # 性能剖析结果的文件名前缀，为空时不剖析
+    'profile': None,
+}
+
+
+def _seed_sequence(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def build_channel(spec, N, ratio, seed=None):
+    """
+    Build a channel model from its description
+
+    A description is a dict with a 'type' and the parameters of the model,
+    or a list of descriptions applied in order:
+
+    - {'type': 'awgn', 'amp': 0.3} or with 'snr_db' or 'ebn0_db' instead
+      of 'amp' (Eb/N0 per information bit of the (12,8) coded link)
+    - {'type': 'rayleigh', 'coherence': 1}
+    - {'type': 'rician', 'K': 10, 'coherence': 1}
+    - {'type': 'phase', 'phase': 0.1}
+    - {'type': 'frequency', 'offset': 1e-4}
+
+    Random models draw from distinct children of `seed`.
+
+    Returns
+    -----------
+    model: channel.ChannelModel
+    """
+    if isinstance(spec, list):
+        seeds = _seed_sequence(seed).spawn(len(spec))
+        return channel.CompositeChannel(*[build_channel(item, N, ratio, seeds[k])
+                                          for k, item in enumerate(spec)])
+
+    spec = dict(spec)
+    kind = spec.pop('type', 'awgn')
+    seed = _seed_sequence(seed)
+    if kind == 'awgn':
+        if 'snr_db' in spec:
+            return channel.AWGNChannel.from_snr(spec.pop('snr_db'), N, ratio, seed=seed)
+        if 'ebn0_db' in spec:
+            return channel.AWGNChannel.from_ebn0(spec.pop('ebn0_db'), N, ratio, 4*8/12, seed=seed)
+        return channel.AWGNChannel(spec.pop('amp'), N, ratio, seed=seed)
+    if kind == 'rayleigh':
+        return channel.RayleighChannel(N, ratio, spec.get('coherence', 1), seed)
+    if kind == 'rician':
+        return channel.RicianChannel(spec['K'], N, ratio, spec.get('coherence', 1), seed)
+    if kind == 'phase':
+        return channel.PhaseOffset(spec['phase'], N, ratio)
+    if kind == 'frequency':
+        return channel.FrequencyOffset(spec['offset'], N, ratio, spec.get('phase', 0.0))
+    raise ValueError('unknown channel type %r' % kind)
+
+
+def build_interleaver(spec):
+    """
+    Build an interleaver from {'type': 'block', 'rows': 8, 'cols': 12} or
+    {'type': 'convolutional', 'branches': 12, 'depth': 1}, None if `spec`
+    is None
+    """
+    if spec is None:
+        return None
+    spec = dict(spec)
+    kind = spec.pop('type', 'block')
+    if kind == 'block':
+        return interleaver.BlockInterleaver(spec['rows'], spec['cols'])
+    if kind == 'convolutional':
+        return interleaver.ConvolutionalInterleaver(spec['branches'], spec.get('depth', 1))
+    raise ValueError('unknown interleaver type %r' % kind)
+
+
+def make_config(config=None, **overrides):
+    """
+    Complete a run configuration with the defaults
+
+    Raises
+    -----------
+    ValueError
+        for keys that are not in `DEFAULT_CONFIG`, invalid choices or
+        unsupported combinations (interleaver or profiling with workers > 1)
+    """
+    merged = copy.deepcopy(DEFAULT_CONFIG)
+    for source in (config or {}), overrides:
+        unknown = set(source) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError('unknown configuration keys: %s' % ', '.join(sorted(unknown)))
+        merged.update(copy.deepcopy(source))
+
+    if merged['backend'] not in backend.BACKENDS:
+        raise ValueError('unknown backend %r' % merged['backend'])
+    if merged['dtype'] not in psk16.DTYPES:
+        raise ValueError('unknown dtype %r' % merged['dtype'])
+    if merged['method'] not in ('correlated', 'coherent'):
+        raise ValueError('unknown demodulation method %r' % merged['method'])
+    if merged['mode'] not in ('passband', 'baseband'):
+        raise ValueError('unknown simulation mode %r' % merged['mode'])
+    if merged['workers'] > 1 and merged['interleaver'] is not None:
+        raise ValueError('the interleaver is only supported with workers=1')
+    if merged['workers'] > 1 and merged['profile']:
+        # 各级处理在子进程中运行，剖析结果不会回到主进程
+        raise ValueError('profiling is only supported with workers=1')
+    return merged
+
+
+def load_configs(path):
+    """
+    Read the run configurations of a JSON or YAML file (YAML needs PyYAML)
+
+    The file holds one configuration, a list of configurations, or a dict
+    with 'defaults' shared by the configurations of its 'runs' list.
+
+    Returns
+    -----------
+    configs: list of dict
+        complete configurations
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError('reading %s needs PyYAML, use a JSON configuration instead' % path)
+            content = yaml.safe_load(f)
+        else:
+            content = json.load(f)
+
+    if isinstance(content, dict) and 'runs' in content:
+        defaults = content.get('defaults', {})
+        runs = [dict(defaults, **run) for run in content['runs']]
+    elif isinstance(content, list):
+        runs = content
+    else:
+        runs = [content]
+    return [make_config(run) for run in runs]
+
+
+def _path(template, config, index):
+    """
+    Fill an output file name template and create its directory
+    """
+    if not template:
+        return None
+    path = template.format(index=index, **config)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return path
+
+
+def run(config, index=0):
+    """
+    Transmit the input file through the link described by `config`
+
+    With one worker the link runs block by block through
+    `pipeline.stream_link`, with more on the shards of
+    `parallel.parallel_link`. The decoded signal is written to the output
+    file and a record with the configuration, the number of PCM codewords
+    received in error and the run time to the record file.
+
+    Returns
+    -----------
+    record: dict
+    """
+    config = make_config(config)
+    backend.set_backend(config['backend'])
+    output = _path(config['output'], config, index)
+    N, ratio = config['N'], config['fc_ratio']
+    seeds = np.random.SeedSequence(config['seed']).spawn(1)
+    if config['channel'] is None:
+        model = channel.AWGNChannel(config['amp'], N, ratio, seeds[0])
+    else:
+        model = build_channel(config['channel'], N, ratio, seeds[0])
+
+    if config['profile']:
+        profiling.reset()
+        profiling.enable()
+    time_start = time.perf_counter()
+    try:
+        if config['workers'] > 1:
+            fs, data_raw = audio_func.audioread(config['input'], mmap=True)
+            data_decoded, codes, errors = parallel.parallel_link(
+                data_raw, fs, ratio, N, method=config['method'], workers=config['workers'],
+                shard=config['shard'], chunk=config['chunk'], mode=config['mode'],
+                channel_model=model, mapping=config['mapping'], dtype=config['dtype'])
+            audio_func.audiowrite(data_decoded, fs, output)
+            result = {'samples': len(data_raw), 'errors': errors,
+                      'error_rate': errors/len(data_raw) if len(data_raw) else 0.0}
+        else:
+            result = pipeline.stream_link(
+                config['input'], output, ratio, N, method=config['method'], chunk=config['chunk'],
+                mode=config['mode'], channel_model=model, mapping=config['mapping'],
+                interleaver=build_interleaver(config['interleaver']), dtype=config['dtype'])
+    finally:
+        if config['profile']:
+            profiling.disable()
+    time_cost = time.perf_counter() - time_start
+
+    record = {'config': config, 'output': output, 'time_cost': time_cost}
+    record.update(result)
+    if config['profile']:
+        prefix = _path(config['profile'], config, index)
+        profiling.write_json(prefix + '.json')
+        profiling.write_chrome_trace(prefix + '_trace.json')
+        record['profile'] = profiling.summary()
+
+    record_path = _path(config['record'], config, index)
+    if record_path:
+        if record_path.endswith('.csv'):
+            # CSV每次运行一行，只保留标量字段
+            metrics.write_record({key: value for key, value in record.items()
+                                  if not isinstance(value, (dict, list))}, record_path)
+        else:
+            metrics.write_record(record, record_path)
+    return record
+
+
+def run_batch(configs):
+    """
+    Run several configurations one after the other in this process, the
+    modules and cached tables are loaded once
+
+    Returns
+    -----------
+    records: list of dict
+    """
+    records = []
+    for index, config in enumerate(configs):
+        records.append(run(config, index))
+    return records
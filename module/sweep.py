@@ -0,0 +1,252 @@
+import concurrent.futures
+import math
+import os
+
+import numpy as np
+
+import module.psk16 as psk16
+import module.channel as channel
+import module.correction as correction
+import module.interleaver as interleaver_module
+import module.metrics as metrics
+from module.bitstream import Bitstream
+
+# 每批仿真的比特数
+DEFAULT_BATCH = 1 << 16
+
+
+def psk16_ser_theory(ebn0_db):
+    """
+    Nearest-neighbour approximation of the 16PSK symbol error rate,
+    Ps = 2Q(sqrt(2Es/N0)*sin(pi/16))
+    """
+    import scipy.special
+
+    esn0 = 4*10**(np.asarray(ebn0_db, dtype=np.float64)/10)
+    x = np.sqrt(2*esn0)*math.sin(math.pi/16)
+    return scipy.special.erfc(x/math.sqrt(2))
+
+
+def psk16_ber_theory(ebn0_db):
+    """
+    Bit error rate of Gray mapped 16PSK, Pb = Ps/4
+    """
+    return psk16_ser_theory(ebn0_db)/4
+
+
+def _source_bits(source, rng, position, length):
+    """
+    Next `length` bits of the source, random bits if it is None, otherwise
+    the bits of `source` repeated cyclically from `position`
+    """
+    if source is None:
+        return rng.integers(0, 2, length, dtype=np.uint8)
+    index = (position + np.arange(length)) % len(source)
+    return source[index]
+
+
+def _converged(errors, trials, target_errors, precision):
+    """
+    Stop once `target_errors` errors are seen or the 95% confidence
+    interval of the error rate is within `precision` of its value
+    """
+    if errors >= target_errors:
+        return True
+    if precision and errors:
+        p = errors/trials
+        return 1.96*math.sqrt(p*(1-p)/trials) <= precision*p
+    return False
+
+
+def simulate_point(ebn0_db, N=10, ratio=10, coded=False, source=None,
+                   batch=DEFAULT_BATCH, target_errors=1000, max_bits=10**8,
+                   precision=None, seed=None, mode='passband', soft=False,
+                   interleaver=None, mapping='natural', dtype=np.float64):
+    """
+    Monte-Carlo estimate of the error rates of the link at one Eb/N0
+
+    Batches of bits are modulated, passed through `channel.AWGN`, demodulated
+    with the vectorized correlation demodulator and compared, until the
+    stopping rule holds or `max_bits` bits were sent.
+
+    Parameters
+    -----------
+    ebn0_db: float
+        Eb/N0 per information bit in dB
+
+    N: int
+        data per analog period
+
+    ratio: int
+        carrier periods per symbol (fc/fs)
+
+    coded: bool
+        apply the (12,8) code around the modem and count errors on the
+        decoded bits
+
+    source: ndarray(n) or Bitstream, optional
+        bits to send cyclically, random bits if not given
+
+    batch: int
+        number of information bits per batch, at least 24, rounded down to
+        a multiple of 24
+
+    target_errors: int
+        stop after this many bit errors
+
+    max_bits: int
+        stop after this many information bits
+
+    precision: float, optional
+        stop once the relative half width of the 95% confidence interval of
+        the bit error rate is below this value
+
+    seed: int or numpy.random.SeedSequence, optional
+        seed of the source and the noise
+
+    mode: str
+        'passband' to synthesize and integrate the sampled waveform,
+        'baseband' to simulate one complex sample per symbol with the
+        equivalent correlator noise
+
+    soft: bool
+        with `coded`, decode the bit LLRs of the demodulator with the soft
+        maximum likelihood decoder instead of the hard decisions
+
+    interleaver: interleaver.BlockInterleaver or ConvolutionalInterleaver, optional
+        with `coded`, interleave the coded bits of each batch before the
+        modulator and deinterleave the decisions (or LLRs) after it; its
+        overhead must be a multiple of 12 bits so every batch stays whole
+        codewords and symbols. A convolutional interleaver keeps its state
+        from one batch to the next, so its fill and flush bits are never
+        sent; the last `overhead` coded bits still in its branches are not
+        counted
+
+    mapping: str or sequence of int
+        16PSK symbol mapping, see `psk16.mapping_tables`
+
+    dtype: numpy dtype
+        precision of the waveform, noise and demodulation, float64 or
+        float32
+
+    Returns
+    -----------
+    result: dict
+        number of bits, symbols and errors and the error rates
+
+    Raises
+    -----------
+    ValueError
+        if `batch` is smaller than 24 bits, or for an interleaver without
+        `coded` or whose overhead is not a multiple of 12 bits
+    """
+    if batch < 24:
+        raise ValueError('batch must hold at least 24 bits, got %d' % batch)
+    if interleaver is not None:
+        if not coded:
+            raise ValueError('the interleaver is only supported with coded=True')
+        if interleaver.overhead % 12:
+            raise ValueError('interleaver overhead must be a multiple of 12 bits')
+    if isinstance(source, Bitstream):
+        source = source.to_bits()
+    elif source is not None:
+        source = np.asarray(source, dtype=np.uint8)
+    batch -= batch % 24
+    rng = np.random.default_rng(seed)
+    # 编码时每个码元携带 4*8/12 个信息比特
+    amp = channel.ebn0_to_amp(ebn0_db, N, ratio, 4*8/12 if coded else 4)
+    # 各批共用载波表与工作缓冲区
+    modem = psk16.PSK16Modem(N, ratio, mapping)
+    # 有时延的交织器在各批之间保持支路状态，作为一个连续的比特流
+    streaming = interleaver is not None and interleaver.overhead > 0
+    if streaming:
+        interleaver.reset()
+        deinterleaver = interleaver.inverted()
+        pending = np.zeros(0, dtype=np.uint8)
+
+    bits = errors = symbols = symbol_errors = offset = 0
+    while bits < max_bits and not _converged(errors, bits, target_errors, precision):
+        message = Bitstream.from_bits(_source_bits(source, rng, offset, batch))
+        offset += message.length
+        sent = correction.correction_en_table(message) if coded else message
+        if streaming:
+            sent = interleaver.process(sent)
+        elif interleaver is not None:
+            sent = interleaver_module.interleave(sent, interleaver)
+
+        if mode == 'baseband':
+            signal = modem.baseband_modulate(sent, dtype)
+            signal = channel.AWGN_baseband(signal, amp, N, ratio, rng)
+            received = modem.baseband_demodulate(signal, packed=True)
+        else:
+            signal = modem.modulate(sent, dtype=dtype)
+            signal = channel.AWGN(signal, amp, rng)
+            received = modem.demodulate(signal, packed=True)
+
+        symbol_errors += metrics.block_errors(sent, received, 4)
+        symbols += sent.length//4
+
+        if coded and soft:
+            if mode == 'baseband':
+                llr = modem.baseband_demodulate_llr(signal, amp)
+            else:
+                llr = modem.demodulate_llr(signal, amp)
+            if streaming:
+                llr = deinterleaver.process(llr)
+            elif interleaver is not None:
+                llr = interleaver_module.deinterleave(llr, interleaver)
+            decoded = correction.correction_de_soft(llr, packed=True)
+        else:
+            if streaming:
+                received = deinterleaver.process(received)
+            elif coded and interleaver is not None:
+                received = interleaver_module.deinterleave(received, interleaver)
+            decoded = correction.correction_de_table(received) if coded else received
+
+        if streaming:
+            # 解交织输出滞后overhead个编码比特，与缓存的信息比特对齐比较
+            pending = np.concatenate([pending, message.to_bits()])
+            message = Bitstream.from_bits(pending[:decoded.length])
+            pending = pending[decoded.length:]
+        errors += metrics.bit_errors(message, decoded)
+        bits += message.length
+
+    return {'ebn0_db': float(ebn0_db), 'bits': bits, 'bit_errors': errors,
+            'ber': errors/bits if bits else 0.0, 'symbols': symbols,
+            'symbol_errors': symbol_errors,
+            'ser': symbol_errors/symbols if symbols else 0.0}
+
+
+def _simulate_point(args):
+    ebn0_db, kwargs = args
+    return simulate_point(ebn0_db, **kwargs)
+
+
+def sweep(ebn0_grid, workers=None, seed=None, **kwargs):
+    """
+    Run `simulate_point` over a grid of Eb/N0 values on several processes
+
+    Point k uses the k-th child of `seed`, so the result does not depend on
+    the number of workers. Remaining keyword arguments are passed to
+    `simulate_point`.
+
+    Returns
+    -----------
+    results: list of dict
+        one result per point, in the order of `ebn0_grid`, with the
+        theoretical 16PSK bit and symbol error rates added
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(ebn0_grid))
+    tasks = [(ebn0_db, dict(kwargs, seed=seeds[k])) for k, ebn0_db in enumerate(ebn0_grid)]
+    workers = workers or os.cpu_count()
+
+    if workers == 1:
+        results = [_simulate_point(task) for task in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_simulate_point, tasks))
+
+    for result in results:
+        result['ber_theory'] = float(psk16_ber_theory(result['ebn0_db']))
+        result['ser_theory'] = float(psk16_ser_theory(result['ebn0_db']))
+    return results